@@ -1,54 +1,113 @@
 # FastAPI main application file
+from pathlib import Path
+from dotenv import load_dotenv
+
+# .env is in project root; fall back to searching upwards when it isn't there.
+# Loaded before the routers so module-level config sees it.
+env_path = Path(__file__).resolve().parent.parent / ".env"
+load_dotenv(dotenv_path=env_path if env_path.is_file() else None)
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.sessions import SessionMiddleware
 from routers import auth, chat
+import asyncio
+import json
 import os
 
 app = FastAPI(
     title="AI Email Assistant API",
     version="1.0.0",
-    description="Backend for AI-powered email management"
+    description="Backend for AI-powered email management",
+    # Chat responses carry whole email lists; orjson encodes them several times faster
+    default_response_class=ORJSONResponse
 )
 
 # Deployed frontend lives on Vercel; fall back to that URL when env var missing
 DEFAULT_FRONTEND_URL = "https://ai-email-assistant-pxbe.vercel.app"
 FRONTEND_URL = os.getenv("FRONTEND_URL", DEFAULT_FRONTEND_URL)
 
-# Session middleware (for OAuth state)
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=os.getenv("JWT_SECRET_KEY")
-)
-
 # CORS middleware
-allowed_origins = {
+# frozenset keeps the per-request origin check O(1); methods/headers are the
+# ones the frontend actually sends, so preflight responses are static
+allowed_origins = frozenset({
     DEFAULT_FRONTEND_URL,
     FRONTEND_URL,
     "https://ai-email-assistant-g4go.onrender.com",  # backend self-calls during OAuth redirects
-}
+})
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=list(allowed_origins),
+    allow_origins=allowed_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
+)
+
+ROOT_RESPONSE = {
+    "message": "AI Email Assistant API",
+    "version": "1.0.0",
+    "status": "running"
+}
+HEALTH_RESPONSE = {"status": "healthy"}
+
+
+class StaticRouteShortcut:
+    """
+    Pure-ASGI wrapper that answers GET / and /health with pre-encoded JSON
+
+    Health probes hit these paths constantly; answering them here skips CORS,
+    routing and response serialization entirely.
+    """
+
+    def __init__(self, app, routes: dict):
+        self.app = app
+        self.responses = {}
+        for path, payload in routes.items():
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            headers = [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ]
+            self.responses[path] = (headers, body)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            response = self.responses.get(scope["path"])
+            if response is not None:
+                headers, body = response
+                await send({"type": "http.response.start", "status": 200, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
+
+
+# Added last so it wraps every other middleware
+app.add_middleware(
+    StaticRouteShortcut,
+    routes={"/": ROOT_RESPONSE, "/health": HEALTH_RESPONSE},
 )
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(chat.router)
 
+@app.on_event("startup")
+async def prefetch_google_keys():
+    # Warm the id_token key cache without holding up startup
+    asyncio.create_task(auth.warm_google_jwks())
+
+@app.on_event("shutdown")
+async def close_http_client():
+    auth.cancel_scheduled_refreshes()
+    await auth.http_client.aclose()
+
+# Normally answered by StaticRouteShortcut; kept so they show up in the API docs
 @app.get("/")
 async def root():
-    return {
-        "message": "AI Email Assistant API",
-        "version": "1.0.0",
-        "status": "running"
-    }
+    return ROOT_RESPONSE
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return HEALTH_RESPONSE
 
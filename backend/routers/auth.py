@@ -1,26 +1,32 @@
 # Authentication router
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request
 from fastapi.responses import RedirectResponse
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from jose import jwt, JWTError
-from datetime import datetime, timedelta
-from pathlib import Path
-from dotenv import load_dotenv
-import requests
+import jwt
+import orjson
+from cachetools import TLRUCache, TTLCache
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from urllib.parse import urlencode
+import asyncio
+import base64
+import httpx
+import hashlib
+import logging
 import os
+import re
 import secrets
+import time
+
+from utils.jwt import JWT_ALGORITHM, JWT_KEY, decode_token, extract_bearer_token
+from utils.rate_limit import RateLimiter
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
-# .env is in project root
-env_path = Path(__file__).resolve().parent.parent.parent / ".env"
-load_dotenv(dotenv_path=env_path)
-load_dotenv()
+logger = logging.getLogger(__name__)
 # ====== ENV CONFIG ======
+# .env is loaded by main.py before any router is imported
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
-JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "https://ai-email-assistant-pxbe.vercel.app")
@@ -28,6 +34,11 @@ BACKEND_URL = os.getenv("BACKEND_URL", "https://ai-email-assistant-g4go.onrender
 
 REDIRECT_URI = f"{BACKEND_URL}/auth/callback"
 
+# OAuth state and PKCE verifier travel in short-lived HttpOnly cookies scoped to /auth
+OAUTH_STATE_COOKIE = "oauth_state"
+OAUTH_VERIFIER_COOKIE = "oauth_verifier"
+OAUTH_STATE_MAX_AGE = 600
+
 SCOPES = [
     "openid",
     "https://www.googleapis.com/auth/userinfo.email",
@@ -37,20 +48,178 @@ SCOPES = [
     "https://www.googleapis.com/auth/gmail.modify",
 ]
 
-CLIENT_CONFIG = {
-    "web": {
-        "client_id": GOOGLE_CLIENT_ID,
-        "client_secret": GOOGLE_CLIENT_SECRET,
-        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-        "token_uri": "https://oauth2.googleapis.com/token",
-        "redirect_uris": [REDIRECT_URI],
-    }
-}
+AUTH_URL = "https://accounts.google.com/o/oauth2/auth"
+TOKEN_URL = "https://oauth2.googleapis.com/token"
+REVOKE_URL = "https://oauth2.googleapis.com/revoke"
+USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
+
+# Everything in the consent URL except state and the PKCE challenge is fixed,
+# so it is encoded once at import
+_AUTH_URL_PREFIX = AUTH_URL + "?" + urlencode({
+    "response_type": "code",
+    "client_id": GOOGLE_CLIENT_ID or "",
+    "redirect_uri": REDIRECT_URI,
+    "scope": " ".join(SCOPES),
+    "access_type": "offline",
+    "include_granted_scopes": "false",  # force full re-consent
+    "prompt": "consent",
+    "code_challenge_method": "S256",
+})
+
+# One keep-alive pool for every call to Google's OAuth endpoints; closed on app shutdown
+http_client = httpx.AsyncClient(
+    timeout=10,
+    limits=httpx.Limits(max_keepalive_connections=50),
+)
+
+JWT_LIFETIME_SECONDS = 7 * 24 * 3600
+
+# Per-IP throttles so a looping client can't get the app rate-limited by Google
+login_limiter = RateLimiter(rate=0.2, capacity=2)
+token_limiter = RateLimiter(rate=1, capacity=3)
+# Separate bucket so a burst of refreshes can never block a logout
+logout_limiter = RateLimiter(rate=1, capacity=3)
+
+# Keyed by a SHA-256 of the access token so raw tokens never sit in memory
+_userinfo_cache = TTLCache(maxsize=10_000, ttl=300)
+
+# Background refreshes fire this long before expiry (bounded), so the next
+# /auth/refresh is answered from _refresh_cache without a Google round-trip.
+# They only run for clients that call /auth/refresh, and stop once a whole
+# token lifetime passes without such a call.
+REFRESH_AHEAD_MAX = 180
+REFRESH_AHEAD_MIN_WAIT = 10
+_scheduled_refreshes: dict = {}
+_refresh_demand: set = set()
+
+# Concurrent refreshes of the same refresh token share one Google round-trip;
+# late arrivals get the freshly minted access token instead of re-using the grant.
+# Entries hold an absolute expires_at and are served until shortly before it
+# (5 minutes when Google doesn't say).
+# Locks are [lock, users] pairs, dropped once nobody holds or waits on them.
+REFRESH_CACHE_DEFAULT_TTL = 300
+_refresh_locks: dict = {}
+_refresh_cache = TLRUCache(
+    maxsize=10_000,
+    ttu=lambda _key, entry, now: (
+        entry["expires_at"] - REFRESH_AHEAD_MIN_WAIT if entry["expires_at"]
+        else now + REFRESH_CACHE_DEFAULT_TTL
+    ),
+    timer=time.time,
+)
+
+# Google's id_token signing keys by kid, kept for as long as Cache-Control allows.
+# An unknown kid triggers a refetch, at most once per JWKS_MIN_REFETCH seconds.
+JWKS_DEFAULT_MAX_AGE = 3600
+JWKS_MIN_REFETCH = 60
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+_google_jwks: dict = {}
+_google_jwks_fetched_at = 0.0
+_google_jwks_expires_at = 0.0
+_google_jwks_lock = asyncio.Lock()
 
 
 # ======= HELPERS =======
 
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+@asynccontextmanager
+async def _refresh_lock(key: str):
+    """Hold the per-token refresh lock; the entry lives while anyone holds or awaits it"""
+    entry = _refresh_locks.get(key)
+    if entry is None:
+        entry = _refresh_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            _refresh_locks.pop(key, None)
+
+
+async def fetch_userinfo(access_token: str) -> dict:
+    key = _token_key(access_token)
+    userinfo = _userinfo_cache.get(key)
+    if userinfo is None:
+        res = await http_client.get(
+            USERINFO_URL,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        res.raise_for_status()
+        userinfo = res.json()
+        _userinfo_cache[key] = userinfo
+    return userinfo
+
+
+async def refresh_google_jwks():
+    global _google_jwks, _google_jwks_fetched_at, _google_jwks_expires_at
+
+    res = await http_client.get(JWKS_URL)
+    res.raise_for_status()
+
+    keys = {jwk["kid"]: jwt.PyJWK(jwk).key for jwk in res.json().get("keys", [])}
+    match = _MAX_AGE_RE.search(res.headers.get("cache-control", ""))
+    max_age = int(match.group(1)) if match else JWKS_DEFAULT_MAX_AGE
+
+    now = time.time()
+    _google_jwks = keys
+    _google_jwks_fetched_at = now
+    _google_jwks_expires_at = now + max_age
+
+
+async def warm_google_jwks():
+    try:
+        await refresh_google_jwks()
+    except Exception as e:
+        print("Failed to prefetch Google JWKS:", e)
+
+
+def _jwks_stale(kid: str) -> bool:
+    now = time.time()
+    if now >= _google_jwks_expires_at:
+        return True
+    return kid not in _google_jwks and now - _google_jwks_fetched_at >= JWKS_MIN_REFETCH
+
+
+async def _google_signing_key(kid: str):
+    if _jwks_stale(kid):
+        async with _google_jwks_lock:
+            if _jwks_stale(kid):
+                await refresh_google_jwks()
+
+    key = _google_jwks.get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown id_token signing key: {kid}")
+    return key
+
+
+async def userinfo_from_id_token(id_token: str) -> dict:
+    # Verified locally against Google's cached signing keys, which saves a
+    # round-trip to /userinfo on every login
+    kid = jwt.get_unverified_header(id_token).get("kid")
+    claims = jwt.decode(
+        id_token,
+        await _google_signing_key(kid),
+        algorithms=["RS256"],
+        audience=GOOGLE_CLIENT_ID,
+        issuer=GOOGLE_ISSUERS,
+    )
+    return {
+        "id": claims.get("sub"),
+        "email": claims.get("email"),
+        "name": claims.get("name"),
+        "picture": claims.get("picture"),
+    }
+
+
 def create_jwt_token(user_data: dict, tokens: dict) -> str:
+    now = int(time.time())
     payload = {
         "user_id": user_data.get("id"),
         "email": user_data.get("email"),
@@ -61,46 +230,187 @@ def create_jwt_token(user_data: dict, tokens: dict) -> str:
         "refresh_token": tokens.get("refresh_token"),
         "token_expiry": tokens.get("expires_in"),
 
-        "iat": datetime.utcnow(),
-        "exp": datetime.utcnow() + timedelta(days=7),
+        "iat": now,
+        "exp": now + JWT_LIFETIME_SECONDS,
         "jti": secrets.token_urlsafe(32),
     }
 
-    return jwt.encode(payload, JWT_SECRET_KEY, algorithm="HS256")
+    # Claims are plain JSON types, so serialize with orjson and sign the bytes directly
+    return jwt.api_jws.encode(orjson.dumps(payload), JWT_KEY, algorithm=JWT_ALGORITHM)
+
+
+async def _post_token(grant: dict) -> dict:
+    """POST a grant to Google's token endpoint; adds an absolute expires_at"""
+    res = await http_client.post(
+        TOKEN_URL,
+        data={
+            **grant,
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+        },
+    )
+    res.raise_for_status()
+    data = res.json()
+
+    expires_in = data.get("expires_in")
+    data["expires_at"] = time.time() + expires_in if expires_in else None
+    return data
+
+
+async def _exchange_code(code: str, code_verifier: str = None) -> dict:
+    grant = {
+        "grant_type": "authorization_code",
+        "code": code,
+        "redirect_uri": REDIRECT_URI,
+    }
+    if code_verifier:
+        grant["code_verifier"] = code_verifier
+    return await _post_token(grant)
+
+
+async def _request_access_token(refresh_token: str) -> dict:
+    data = await _post_token({
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token,
+    })
+    return {
+        "access_token": data["access_token"],
+        "expires_at": data["expires_at"],
+    }
+
+
+def _token_response(entry: dict) -> dict:
+    expires_at = entry["expires_at"]
+    return {
+        "access_token": entry["access_token"],
+        "expires_in": max(expires_at - time.time(), 0) if expires_at else None,
+    }
+
+
+def schedule_token_refresh(refresh_token: str, expires_in: float):
+    """
+    Refresh an access token shortly before it expires, off the request path.
+    Keeps going for as long as the client keeps calling /auth/refresh.
+    """
+    if not refresh_token or not expires_in:
+        return
+
+    key = _token_key(refresh_token)
+    _refresh_demand.add(key)
+    if key in _scheduled_refreshes:
+        return
+
+    task = asyncio.create_task(_refresh_later(key, refresh_token, expires_in))
+    _scheduled_refreshes[key] = task
+    task.add_done_callback(lambda t: _forget_refresh_task(key, t))
+
+
+def _forget_refresh_task(key: str, task: asyncio.Task):
+    # A task cancelled on logout must not unregister one scheduled by a later refresh
+    if _scheduled_refreshes.get(key) is task:
+        del _scheduled_refreshes[key]
+        _refresh_demand.discard(key)
+
+
+def _refresh_wait(expires_in: float) -> float:
+    ahead = min(expires_in / 10, REFRESH_AHEAD_MAX)
+    return max(expires_in - ahead, REFRESH_AHEAD_MIN_WAIT)
+
+
+async def _refresh_later(key: str, refresh_token: str, expires_in: float):
+    while True:
+        await asyncio.sleep(_refresh_wait(expires_in))
+        if key not in _refresh_demand:
+            # Idle for a whole token lifetime
+            return
+        _refresh_demand.discard(key)
+
+        try:
+            async with _refresh_lock(key):
+                entry = await _request_access_token(refresh_token)
+                _refresh_cache[key] = entry
+        except Exception:
+            # No caller to report to, so log it with the traceback
+            logger.exception("Background token refresh failed")
+            return
+
+        if not entry["expires_at"]:
+            return
+        expires_in = entry["expires_at"] - time.time()
+
+
+def cancel_token_refresh(refresh_token: str):
+    """Stop background refreshes for a token and forget the access token minted from it"""
+    key = _token_key(refresh_token)
+    task = _scheduled_refreshes.pop(key, None)
+    if task:
+        task.cancel()
+    _refresh_demand.discard(key)
+    # Lock entries drop themselves once their last holder or waiter leaves
+    _refresh_cache.pop(key, None)
+
+
+def cancel_scheduled_refreshes():
+    for task in list(_scheduled_refreshes.values()):
+        task.cancel()
+    _scheduled_refreshes.clear()
+
+
+def _code_challenge(verifier: str) -> str:
+    digest = hashlib.sha256(verifier.encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def _set_auth_cookie(response: RedirectResponse, name: str, value: str):
+    response.set_cookie(
+        name,
+        value,
+        max_age=OAUTH_STATE_MAX_AGE,
+        path="/auth",
+        httponly=True,
+        secure=True,
+        samesite="lax",
+    )
+
+
+@lru_cache(maxsize=16)
+def _error_redirect(error: str) -> RedirectResponse:
+    # Shared across requests, so only for responses that never set cookies
+    return RedirectResponse(
+        f"{FRONTEND_URL}/login?{urlencode({'error': error})}",
+        status_code=303,
+    )
 
 
 def verify_state(expected: str, received: str):
-    if not expected or expected != received:
+    if not expected or not received or not secrets.compare_digest(expected, received):
         raise HTTPException(400, "Invalid OAuth state")
 
 
 # ======= ROUTES =======
 
-@router.get("/login")
-def google_login(request: Request):
+@router.get("/login", dependencies=[Depends(login_limiter)])
+async def google_login(request: Request):
     try:
-        # Validate client config before creating flow
+        # Validate client config before building the consent URL
         if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
             raise HTTPException(
                 500, 
                 "OAuth client credentials not configured. Please set GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET in your .env file."
             )
-        
-        flow = Flow.from_client_config(
-            CLIENT_CONFIG,
-            scopes=SCOPES,
-            redirect_uri=REDIRECT_URI
-        )
 
-        auth_url, state = flow.authorization_url(
-            access_type="offline",
-            include_granted_scopes=False,  # force full re-consent
-            prompt="consent"
-        )
+        state = secrets.token_urlsafe(32)
+        verifier = secrets.token_urlsafe(64)
 
-        request.session["oauth_state"] = state
+        auth_url = _AUTH_URL_PREFIX + "&" + urlencode({
+            "state": state,
+            "code_challenge": _code_challenge(verifier),
+        })
 
-        return RedirectResponse(auth_url)
+        response = RedirectResponse(auth_url)
+        _set_auth_cookie(response, OAUTH_STATE_COOKIE, state)
+        _set_auth_cookie(response, OAUTH_VERIFIER_COOKIE, verifier)
+        return response
 
     except HTTPException:
         raise
@@ -109,74 +419,82 @@ def google_login(request: Request):
 
 
 @router.get("/callback")
-def google_callback(request: Request, code: str = None, state: str = None, error: str = None):
+async def google_callback(request: Request, code: str = None, state: str = None, error: str = None):
     if error:
-        return RedirectResponse(f"{FRONTEND_URL}/login?error={error}")
+        return _error_redirect(error)
 
     if not code:
-        return RedirectResponse(f"{FRONTEND_URL}/login?error=missing_code")
+        return _error_redirect("missing_code")
 
     try:
-        verify_state(request.session.get("oauth_state"), state)
+        verify_state(request.cookies.get(OAUTH_STATE_COOKIE), state)
 
-        flow = Flow.from_client_config(
-            CLIENT_CONFIG,
-            scopes=SCOPES,
-            redirect_uri=REDIRECT_URI
+        token_data = await _exchange_code(
+            code, request.cookies.get(OAUTH_VERIFIER_COOKIE)
         )
 
-        flow.fetch_token(code=code)
-        creds = flow.credentials
+        if token_data.get("id_token"):
+            userinfo = await userinfo_from_id_token(token_data["id_token"])
+        else:
+            userinfo = await fetch_userinfo(token_data["access_token"])
 
-        userinfo = requests.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {creds.token}"}
-        ).json()
+        expires_at = token_data["expires_at"]
 
         tokens = {
-            "access_token": creds.token,
-            "refresh_token": creds.refresh_token,
-            "expires_in": creds.expiry.timestamp() if creds.expiry else None,
+            "access_token": token_data["access_token"],
+            "refresh_token": token_data.get("refresh_token"),
+            "expires_in": expires_at,
         }
 
         jwt_token = create_jwt_token(userinfo, tokens)
 
-        return RedirectResponse(f"{FRONTEND_URL}/dashboard?token={jwt_token}")
+        # 303 so a browser refresh never replays the callback
+        response = RedirectResponse(
+            f"{FRONTEND_URL}/dashboard?{urlencode({'token': jwt_token})}",
+            status_code=303,
+        )
+        response.delete_cookie(OAUTH_STATE_COOKIE, path="/auth")
+        response.delete_cookie(OAUTH_VERIFIER_COOKIE, path="/auth")
+        return response
 
     except Exception as e:
         print("OAuth Error:", e)
-        return RedirectResponse(f"{FRONTEND_URL}/login?error=auth_failed")
+        return _error_redirect("auth_failed")
 
 
-@router.post("/refresh")
-def refresh_token(refresh_token: str):
-    try:
-        creds = Credentials(
-            token=None,
-            refresh_token=refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=GOOGLE_CLIENT_ID,
-            client_secret=GOOGLE_CLIENT_SECRET,
-        )
+@router.post("/refresh", dependencies=[Depends(token_limiter)])
+async def refresh_token(refresh_token: str):
+    key = _token_key(refresh_token)
 
-        from google.auth.transport.requests import Request as GoogleRequest
-        creds.refresh(GoogleRequest())
+    try:
+        async with _refresh_lock(key):
+            entry = _refresh_cache.get(key)
+            if entry is None:
+                entry = await _request_access_token(refresh_token)
+                _refresh_cache[key] = entry
 
-        return {
-            "access_token": creds.token,
-            "expires_in": (creds.expiry - datetime.utcnow()).total_seconds()
-            if creds.expiry else None,
-        }
+        response = _token_response(entry)
+        schedule_token_refresh(refresh_token, response["expires_in"])
+        return response
 
     except Exception as e:
         raise HTTPException(401, f"Failed to refresh token: {e}")
 
 
-@router.post("/logout")
-def logout(token: str):
-    res = requests.post(
-        "https://oauth2.googleapis.com/revoke",
-        params={"token": token},
+@router.post("/logout", dependencies=[Depends(logout_limiter)])
+async def logout(token: str = Body(..., embed=True)):
+    # The frontend sends its app JWT; the Google grant to revoke is inside it.
+    # Anything else is taken to be a Google token.
+    try:
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
+        payload = {}
+    google_token = payload.get("refresh_token") or payload.get("access_token") or token
+    cancel_token_refresh(google_token)
+
+    res = await http_client.post(
+        REVOKE_URL,
+        params={"token": google_token},
         headers={"content-type": "application/x-www-form-urlencoded"}
     )
 
@@ -187,15 +505,14 @@ def logout(token: str):
 
 
 @router.get("/me")
-def get_current_user(request: Request):
-    auth = request.headers.get("Authorization")
-    if not auth or not auth.startswith("Bearer "):
+async def get_current_user(authorization: str = Header(None)):
+    token = extract_bearer_token(authorization)
+    if not token:
         raise HTTPException(401, "Missing token")
 
-    token = auth.split()[1]
-
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
+        # decode_token caches verified tokens itself
+        payload = decode_token(token)
         return {
             "user_id": payload.get("user_id"),
             "email": payload.get("email"),
@@ -203,6 +520,6 @@ def get_current_user(request: Request):
             "picture": payload.get("picture"),
         }
 
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(401, "Invalid or expired token")
 
@@ -3,10 +3,16 @@
 Chat API endpoints for processing natural language commands and actions
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-from datetime import datetime
-import uuid
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+import asyncio
+import orjson
+import os
+import re
 
 from utils.jwt import get_current_user, get_gmail_credentials
 from services.gmail_service import GmailService
@@ -19,6 +25,43 @@ router = APIRouter(prefix="/chat", tags=["Chat"])
 gemini_service = GeminiService()
 nlp_service = NLPService()
 
+# Caps concurrent Gemini calls so a large inbox can't flood the API
+GEMINI_CONCURRENCY = 8
+_gemini_semaphore = asyncio.Semaphore(GEMINI_CONCURRENCY)
+
+# Emails per multi-email Gemini prompt; larger batches risk truncated JSON
+LLM_BATCH_SIZE = 10
+# Emails per prompt when streaming replies, so the first ones arrive while
+# the rest are still being generated
+STREAM_REPLY_BATCH_SIZE = 2
+
+# Inbox size fetched alongside parse_command when the message looks like a
+# read (default count 5) or a categorize (default count 20) request
+PREFETCH_READ_COUNT = 5
+PREFETCH_CATEGORIZE_COUNT = 20
+
+# Fallback intent keywords when Gemini returns no known action. Only the start
+# of each word is anchored so "emails", "messages" and "grouping" match too.
+_INTENT_RE = re.compile(r'\b(email|inbox|message|digest|categori[sz]e|group)', re.IGNORECASE)
+
+# Gemini category names -> display groups, in display order
+CATEGORY_MAP = {
+    "work": "Work",
+    "promotions": "Promotions",
+    "personal": "Personal",
+    "urgent": "Urgent",
+    "other": "Other"
+}
+
+# Emails shown (and individually summarized) under the daily digest
+DIGEST_TOP_EMAILS = 10
+
+REPLIES_HEADER = "Here are the suggested replies for your emails:\n\n"
+NO_REPLY_TARGETS = "No emails found to generate replies for."
+
+# Address part of a "Name <email>" sender
+_SENDER_RE = re.compile(r'<([^>]+)>')
+
 
 class MessageRequest(BaseModel):
     message: str
@@ -46,37 +89,38 @@ def create_response(
 ) -> Dict:
     """Create standardized response format"""
     return {
-        "id": str(uuid.uuid4()),
+        "id": os.urandom(8).hex(),
         "content": content,
         "emails": emails or [],
         "actions": actions or [],
         "groupedEmails": grouped_emails or [],
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds")
     }
 
 
+@lru_cache(maxsize=4096)
+def _parse_rfc2822(email_date: str) -> Optional[str]:
+    """ISO timestamp for an RFC 2822 date header, or None if it doesn't parse"""
+    try:
+        return parsedate_to_datetime(email_date).isoformat()
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
 def format_email_for_display(email: Dict) -> Dict:
     """Format raw email data for display"""
     sender_name = email.get("sender_name", "Unknown")
     sender_email = email.get("sender_email") or email.get("sender", "")
     if isinstance(sender_email, str) and "<" in sender_email:
         # Parse sender email from "Name <email>" format
-        import re
-        match = re.search(r'<(.+?)>', sender_email)
+        match = _SENDER_RE.search(sender_email)
         if match:
             sender_email = match.group(1)
     
     # Parse date and create timestamp
     email_date = email.get("date", "")
-    timestamp = None
-    if email_date:
-        try:
-            from email.utils import parsedate_to_datetime
-            date_obj = parsedate_to_datetime(email_date)
-            timestamp = date_obj.isoformat()
-        except (ValueError, TypeError, AttributeError):
-            # If parsing fails, use the raw date string
-            pass
+    # If parsing fails, the raw date string is still returned
+    timestamp = _parse_rfc2822(email_date) if email_date else None
     
     return {
         "id": email["id"],
@@ -92,47 +136,214 @@ def format_email_for_display(email: Dict) -> Dict:
     }
 
 
-def enrich_emails_with_summaries(emails: List[Dict]) -> List[Dict]:
-    """Add AI summaries to email list"""
+async def summarize_email_async(email_body: str, max_sentences: int = 2) -> str:
+    """Gemini summary of one email, bounded by the shared semaphore"""
+    # Cached answers don't need to wait for a semaphore slot
+    summary = gemini_service.cached_summary(email_body, max_sentences)
+    if summary is not None:
+        return summary
+
+    async with _gemini_semaphore:
+        return await gemini_service.summarize_email(email_body, max_sentences=max_sentences)
+
+
+async def generate_reply_async(
+    email_body: str,
+    sender_name: str,
+    tone: str = "professional",
+    context: Optional[str] = None
+) -> str:
+    """gemini_service.generate_reply, bounded by the shared semaphore"""
+    reply = gemini_service.cached_reply(email_body, sender_name, tone, context)
+    if reply is not None:
+        return reply
+
+    async with _gemini_semaphore:
+        return await gemini_service.generate_reply(
+            email_body=email_body,
+            sender_name=sender_name,
+            tone=tone,
+            context=context
+        )
+
+
+async def generate_digest_async(emails: List[Dict]) -> str:
+    """gemini_service.generate_digest, bounded by the shared semaphore"""
+    digest = gemini_service.cached_digest(emails)
+    if digest is not None:
+        return digest
+
+    async with _gemini_semaphore:
+        return await gemini_service.generate_digest(emails)
+
+
+async def summarize_emails_async(email_bodies: List[str], max_sentences: int = 2) -> List[str]:
+    """
+    Summarize many emails with one Gemini prompt per LLM_BATCH_SIZE uncached bodies.
+    Batches whose response can't be parsed fall back to per-email calls.
+    """
+    summaries = {}
+    for body in email_bodies:
+        summary = gemini_service.cached_summary(body, max_sentences)
+        if summary is not None:
+            summaries[body] = summary
+    missing = [body for body in dict.fromkeys(email_bodies) if body not in summaries]
+
+    async def summarize_chunk(chunk: List[str]):
+        if len(chunk) > 1:
+            async with _gemini_semaphore:
+                batch = await gemini_service.summarize_emails_batch(chunk, max_sentences=max_sentences)
+            if batch is not None:
+                summaries.update(zip(chunk, batch))
+                return
+        chunk_summaries = await asyncio.gather(*(summarize_email_async(body, max_sentences) for body in chunk))
+        summaries.update(zip(chunk, chunk_summaries))
+
+    await asyncio.gather(*(
+        summarize_chunk(missing[i:i + LLM_BATCH_SIZE])
+        for i in range(0, len(missing), LLM_BATCH_SIZE)
+    ))
+    return [summaries[body] for body in email_bodies]
+
+
+async def generate_replies_async(emails: List[Dict], tone: str = "professional") -> List[str]:
+    """
+    Replies for many emails (dicts with 'body' and 'sender_name'), one Gemini
+    prompt per LLM_BATCH_SIZE uncached emails, falling back to per-email calls
+    """
+    keys = [(email["body"], email["sender_name"]) for email in emails]
+    replies = {}
+    for body, sender_name in keys:
+        reply = gemini_service.cached_reply(body, sender_name, tone)
+        if reply is not None:
+            replies[(body, sender_name)] = reply
+    missing = [(key, email) for key, email in dict(zip(keys, emails)).items() if key not in replies]
+
+    async def reply_chunk(chunk: List[tuple]):
+        if len(chunk) > 1:
+            async with _gemini_semaphore:
+                batch = await gemini_service.generate_replies_batch([email for _, email in chunk], tone=tone)
+            if batch is not None:
+                replies.update(zip((key for key, _ in chunk), batch))
+                return
+        chunk_replies = await asyncio.gather(*(
+            generate_reply_async(email["body"], email["sender_name"], tone=tone)
+            for _, email in chunk
+        ))
+        replies.update(zip((key for key, _ in chunk), chunk_replies))
+
+    await asyncio.gather(*(
+        reply_chunk(missing[i:i + LLM_BATCH_SIZE])
+        for i in range(0, len(missing), LLM_BATCH_SIZE)
+    ))
+
+    return [replies[key] for key in keys]
+
+
+def email_body(email: Dict) -> str:
+    """Text to summarize for an email, falling back to its snippet"""
+    return email.get("body", "") or email.get("snippet", "")
+
+
+def with_summaries(emails: List[Dict], summaries: List[str]) -> List[Dict]:
+    """Display-formatted emails with their summaries attached"""
     enriched = []
-    for email in emails:
+    for email, summary in zip(emails, summaries):
         formatted = format_email_for_display(email)
-        formatted["summary"] = gemini_service.summarize_email(
-            email.get("body", "") or email.get("snippet", ""),
-            max_sentences=2
-        )
+        formatted["summary"] = summary
         enriched.append(formatted)
     return enriched
 
 
+async def digest_with_summaries(emails: List[Dict], summarized: List[Dict]) -> tuple:
+    """
+    Digest of all emails plus one-sentence summaries of `summarized`, from a
+    single Gemini call unless everything is cached. Falls back to the separate
+    digest and summary calls if the combined response can't be parsed.
+    """
+    bodies = [email_body(email) for email in summarized]
+
+    digest = gemini_service.cached_digest(emails)
+    summaries = [gemini_service.cached_summary(body, 1) for body in bodies]
+    if digest is not None and None not in summaries:
+        return digest, summaries
+
+    async with _gemini_semaphore:
+        combined = await gemini_service.generate_digest_with_summaries(emails, bodies)
+    if combined is None:
+        return await asyncio.gather(
+            generate_digest_async(emails),
+            summarize_emails_async(bodies, max_sentences=1)
+        )
+    return combined["digest"], combined["summaries"]
+
+
+async def enrich_emails_with_summaries(emails: List[Dict], max_sentences: int = 2) -> List[Dict]:
+    """Add AI summaries to email list, batching the Gemini calls"""
+    summaries = await summarize_emails_async([email_body(email) for email in emails], max_sentences)
+    return with_summaries(emails, summaries)
+
+
+def make_action(
+    action_id: str,
+    action_type: str,
+    label: str,
+    email_id: Optional[str] = None,
+    payload: Optional[Dict] = None,
+    **confirm: str
+) -> Dict:
+    """Action button for the frontend; confirm* keyword fields make it require confirmation"""
+    action = {"id": action_id, "type": action_type, "label": label}
+    if email_id is not None:
+        action["emailId"] = email_id
+    if payload is not None:
+        action["payload"] = payload
+    if confirm:
+        action["requiresConfirmation"] = True
+        action.update(confirm)
+    return action
+
+
+def send_reply_action(email_id: str, label: str, reply_text: str, subject: str, sender_name: str) -> Dict:
+    """Confirmable action that sends a generated reply"""
+    return make_action(
+        f"send-reply-{email_id}",
+        "send_reply",
+        label,
+        email_id,
+        {"replyText": reply_text, "subject": subject, "sender": sender_name},
+        confirmTitle="Send Reply?",
+        confirmDescription=f"Send this reply to {sender_name}?"
+    )
+
+
 def prepare_reply_actions(emails: List[Dict]) -> List[Dict]:
     """Create action buttons for reply generation"""
     actions = []
     
     # Add "Generate Replies for All" action
     if len(emails) > 1:
-        actions.append({
-            "id": "generate-all-replies",
-            "type": "generate_replies",
-            "label": "Generate Replies for All",
-            "payload": {
+        actions.append(make_action(
+            "generate-all-replies",
+            "generate_replies",
+            "Generate Replies for All",
+            payload={
                 "emailIds": [email["id"] for email in emails],
                 "emails": emails
             }
-        })
+        ))
     
     # Add individual reply actions
-    for idx, email in enumerate(emails, 1):
-        actions.append({
-            "id": f"reply-{email['id']}",
-            "type": "reply",
-            "label": f"Reply to #{idx}",
-            "emailId": email["id"],
-            "payload": {
-                "subject": email["subject"],
-                "sender": email["sender"]
-            }
-        })
+    actions.extend(
+        make_action(
+            f"reply-{email['id']}",
+            "reply",
+            f"Reply to #{idx}",
+            email["id"],
+            {"subject": email["subject"], "sender": email["sender"]}
+        )
+        for idx, email in enumerate(emails, 1)
+    )
     
     return actions
 
@@ -160,54 +371,113 @@ def build_group_summaries(categorized: Dict[str, List[Dict]]) -> List[Dict]:
     return summaries
 
 
+def get_nth_email(gmail_service: GmailService, email_number: int, need_body: bool = True) -> Optional[Dict]:
+    """Fetch only the nth inbox email instead of the first n"""
+    email_id = gmail_service.fetch_nth_email_id(email_number)
+    return gmail_service.get_email_by_id(email_id, need_body=need_body) if email_id else None
+
+
 def find_email_by_criteria(
     gmail_service: GmailService,
     email_number: Optional[int] = None,
     sender: Optional[str] = None,
     subject_keywords: Optional[List[str]] = None,
-    user_message: str = ""
+    user_message: str = "",
+    need_body: bool = True
 ) -> Optional[Dict]:
-    """Find email using various criteria"""
-    target_email = None
-    
+    """Find email using various criteria; need_body=False skips fetching the body"""
     # By email number
     if email_number:
-        emails = gmail_service.fetch_emails(max_results=email_number)
-        if len(emails) >= email_number:
-            return emails[email_number - 1]
+        target_email = get_nth_email(gmail_service, email_number, need_body)
+        if target_email:
+            return target_email
     
     # By sender
     if sender:
         query = f"from:{sender}"
-        emails = gmail_service.search_emails(query, max_results=1)
+        emails = gmail_service.search_emails(query, max_results=1, need_body=need_body)
         if emails:
             return emails[0]
     
     # By subject keyword
     if subject_keywords:
         query = f"subject:{subject_keywords[0]}"
-        emails = gmail_service.search_emails(query, max_results=1)
+        emails = gmail_service.search_emails(query, max_results=1, need_body=need_body)
         if emails:
             return emails[0]
     
-    # Try NLP extraction as fallback
-    if not target_email:
-        email_number = nlp_service.extract_email_number(user_message)
-        if email_number:
-            emails = gmail_service.fetch_emails(max_results=email_number)
-            if len(emails) >= email_number:
-                return emails[email_number - 1]
-        
-        sender = nlp_service.extract_sender(user_message)
-        if sender:
-            query = f"from:{sender}"
-            emails = gmail_service.search_emails(query, max_results=1)
-            if emails:
-                return emails[0]
+    # Try NLP extraction as fallback, skipping lookups that already missed above
+    extracted_number = nlp_service.extract_email_number(user_message)
+    if extracted_number and extracted_number != email_number:
+        target_email = get_nth_email(gmail_service, extracted_number, need_body)
+        if target_email:
+            return target_email
+    
+    extracted_sender = nlp_service.extract_sender(user_message)
+    if extracted_sender and extracted_sender != sender:
+        query = f"from:{extracted_sender}"
+        emails = gmail_service.search_emails(query, max_results=1, need_body=need_body)
+        if emails:
+            return emails[0]
     
     return None
 
 
+def keyword_intent(user_message: str) -> Optional[str]:
+    """'digest', 'categorize' or 'read' from inbox keywords in the message, else None"""
+    keywords = {word.lower() for word in _INTENT_RE.findall(user_message)}
+    if not keywords:
+        return None
+    if "digest" in keywords:
+        return "digest"
+    if keywords & {"categorize", "categorise", "group"}:
+        return "categorize"
+    return "read"
+
+
+def _prefetch_plan(user_message: str) -> tuple:
+    """
+    How many inbox emails to fetch speculatively while Gemini parses the
+    message, and whether their bodies are needed (read summarizes them,
+    categorize only uses headers and snippets)
+    """
+    if keyword_intent(user_message) == "categorize":
+        return PREFETCH_CATEGORIZE_COUNT, False
+    if nlp_service.detect_intent(user_message) == "read":
+        return PREFETCH_READ_COUNT, True
+    return 0, False
+
+
+async def prefetch_emails(gmail_service: GmailService, plan: tuple) -> Optional[List[Dict]]:
+    """Speculative inbox fetch; a failure just means the handler fetches again"""
+    count, need_body = plan
+    if not count:
+        return None
+    try:
+        return await asyncio.to_thread(gmail_service.fetch_emails, max_results=count, need_body=need_body)
+    except Exception as e:
+        print(f"Error prefetching emails: {e}")
+        return None
+
+
+async def fetch_inbox(
+    gmail_service: GmailService,
+    count: int,
+    prefetched: Optional[List[Dict]] = None,
+    need_body: bool = False
+) -> List[Dict]:
+    """
+    Latest `count` inbox emails, served from the prefetch when it covers them.
+    A prefetch without bodies still saves the listing when bodies are needed.
+    """
+    if prefetched is not None and isinstance(count, int) and count <= len(prefetched):
+        emails = prefetched[:count]
+        if need_body and not all(email.get("body") for email in emails):
+            return await asyncio.to_thread(gmail_service.get_emails_batch, [email["id"] for email in emails])
+        return emails
+    return await asyncio.to_thread(gmail_service.fetch_emails, max_results=count, need_body=need_body)
+
+
 # Main Endpoints
 
 @router.post("/message")
@@ -220,19 +490,22 @@ async def process_message(
     try:
         user_message = request.message.strip()
         
-        # Parse command using Gemini
-        parsed = gemini_service.parse_command(user_message)
+        # Parse command using Gemini while the inbox is fetched for likely read/categorize requests
+        parsed, prefetched = await asyncio.gather(
+            gemini_service.parse_command(user_message),
+            prefetch_emails(gmail_service, _prefetch_plan(user_message))
+        )
         action = parsed.get("action", "unknown")
         params = parsed.get("parameters", {})
         
         # Handle different actions
         action_handlers = {
-            "read": lambda: handle_read_emails(gmail_service, params),
+            "read": lambda: handle_read_emails(gmail_service, params, prefetched),
             "reply": lambda: handle_reply_request(gmail_service, user_message, params),
             "delete": lambda: handle_delete_request(gmail_service, user_message, params),
             "search": lambda: handle_search_emails(gmail_service, params),
             "digest": lambda: handle_daily_digest(gmail_service, params),
-            "categorize": lambda: handle_categorize_emails(gmail_service, params),
+            "categorize": lambda: handle_categorize_emails(gmail_service, params, prefetched),
         }
         
         handler = action_handlers.get(action)
@@ -240,13 +513,13 @@ async def process_message(
             return await handler()
         
         # Default: try to read emails or provide helpful response
-        user_msg_lower = user_message.lower()
-        if any(word in user_msg_lower for word in ["email", "emails", "inbox", "messages", "digest", "categorize"]):
-            if "digest" in user_msg_lower:
-                return await handle_daily_digest(gmail_service, params)
-            elif "categorize" in user_msg_lower or "group" in user_msg_lower:
-                return await handle_categorize_emails(gmail_service, params)
-            return await handle_read_emails(gmail_service, {"count": 5})
+        fallback = keyword_intent(user_message)
+        if fallback == "digest":
+            return await handle_daily_digest(gmail_service, params)
+        if fallback == "categorize":
+            return await handle_categorize_emails(gmail_service, params, prefetched)
+        if fallback == "read":
+            return await handle_read_emails(gmail_service, {"count": 5}, prefetched)
         
         return create_response(
             "I can help you with your emails! Try:\n\n"
@@ -295,17 +568,38 @@ async def handle_action(
         raise HTTPException(status_code=500, detail=f"Failed to handle action: {str(e)}")
 
 
+@router.post("/action/stream")
+async def handle_action_stream(
+    request: ActionRequest,
+    user: dict = Depends(get_current_user),
+    gmail_service: GmailService = Depends(get_gmail_service)
+):
+    """Stream generate_replies results as Server-Sent Events while Gemini works through them"""
+    if request.type != "generate_replies":
+        raise HTTPException(status_code=400, detail=f"Streaming is not supported for action type: {request.type}")
+    
+    return StreamingResponse(
+        stream_generated_replies(gmail_service, request.payload or {}),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # Email Handlers 
 
-async def handle_read_emails(gmail_service: GmailService, params: Dict) -> Dict:
+async def handle_read_emails(
+    gmail_service: GmailService,
+    params: Dict,
+    prefetched: Optional[List[Dict]] = None
+) -> Dict:
     """Read and summarize emails"""
     count = params.get("count", 5)
-    emails = gmail_service.fetch_emails(max_results=count)
+    emails = await fetch_inbox(gmail_service, count, prefetched, need_body=True)
     
     if not emails:
         return create_response("No emails found in your inbox.")
     
-    emails_with_summaries = enrich_emails_with_summaries(emails)
+    emails_with_summaries = await enrich_emails_with_summaries(emails)
     
     # Keep the chat response concise and let the UI render the detailed email cards.
     # We only send a short intro message; individual email details are provided
@@ -316,21 +610,25 @@ async def handle_read_emails(gmail_service: GmailService, params: Dict) -> Dict:
     return create_response(content, emails_with_summaries, actions)
 
 
-async def handle_categorize_emails(gmail_service: GmailService, params: Dict) -> Dict:
+async def handle_categorize_emails(
+    gmail_service: GmailService,
+    params: Dict,
+    prefetched: Optional[List[Dict]] = None
+) -> Dict:
     """Fetch and categorize emails into groups"""
     count = params.get("count", 20)
-    emails = gmail_service.fetch_emails(max_results=count)
+    emails = await fetch_inbox(gmail_service, count, prefetched)
     
     if not emails:
         return create_response("No emails found to categorize.")
     
-    # Create email list for categorization API
+    # Format each email once and build the categorization payload in the same pass
+    formatted_by_id = {}
     email_list_for_categorization = []
-    email_id_to_email = {}
     
     for email in emails:
         email_id = email["id"]
-        email_id_to_email[email_id] = email
+        formatted_by_id[email_id] = format_email_for_display(email)
         email_list_for_categorization.append({
             "id": email_id,
             "sender_name": email.get("sender_name", "Unknown"),
@@ -340,44 +638,36 @@ async def handle_categorize_emails(gmail_service: GmailService, params: Dict) ->
         })
     
     # Categorize using AI
-    categories = gemini_service.categorize_emails(email_list_for_categorization)
-    
-    # Map categories to full email objects
-    categorized = {
-        "Work": [],
-        "Promotions": [],
-        "Personal": [],
-        "Urgent": [],
-        "Other": []
-    }
+    async with _gemini_semaphore:
+        categories = await gemini_service.categorize_emails(email_list_for_categorization)
     
-    category_map = {
-        "work": "Work",
-        "promotions": "Promotions",
-        "personal": "Personal",
-        "urgent": "Urgent",
-        "other": "Other"
-    }
+    # Map categories to full email objects, keeping the fixed display order
+    categorized = {name: [] for name in CATEGORY_MAP.values()}
     
     for cat_name, email_ids in categories.items():
-        mapped_name = category_map.get(cat_name.lower(), "Other")
+        label = cat_name.lower()
+        bucket = categorized[CATEGORY_MAP.get(label, "Other")]
         for email_id in email_ids:
-            if email_id in email_id_to_email:
-                original_email = email_id_to_email[email_id]
-                formatted = format_email_for_display(original_email)
-                formatted["category"] = cat_name.lower()
-                categorized[mapped_name].append(formatted)
+            formatted = formatted_by_id.get(email_id)
+            if formatted is None:
+                continue
+            # Gemini may file one email under several categories; each entry keeps its own label
+            if "category" in formatted:
+                formatted = dict(formatted)
+            formatted["category"] = label
+            bucket.append(formatted)
     
     # Generate summaries for each category
-    content = "📧 **Smart Inbox Grouping**\n\n"
+    parts = ["📧 **Smart Inbox Grouping**\n\n"]
     for category, cat_emails in categorized.items():
         if cat_emails:
-            content += f"**{category}** ({len(cat_emails)} emails)\n"
+            parts.append(f"**{category}** ({len(cat_emails)} emails)\n")
             for email in cat_emails[:5]:  # Show first 5 per category
-                content += f"• {email['subject']} - {email['sender']['name']}\n"
+                parts.append(f"• {email['subject']} - {email['sender']['name']}\n")
             if len(cat_emails) > 5:
-                content += f"  ... and {len(cat_emails) - 5} more\n"
-            content += "\n"
+                parts.append(f"  ... and {len(cat_emails) - 5} more\n")
+            parts.append("\n")
+    content = "".join(parts)
     
     all_emails = [email for emails_list in categorized.values() for email in emails_list]
     actions = prepare_reply_actions(all_emails) if all_emails else []
@@ -390,26 +680,21 @@ async def handle_daily_digest(gmail_service: GmailService, params: Dict) -> Dict
     # Fetch today's emails
     today = datetime.now()
     query = f"after:{today.strftime('%Y/%m/%d')}"
-    emails = gmail_service.search_emails(query, max_results=50)
+    emails = await asyncio.to_thread(gmail_service.search_emails, query, max_results=50)
     
     if not emails:
         return create_response("No emails found for today.")
     
-    # Prepare emails for digest
-    email_list = []
-    for email in emails:
-        formatted = format_email_for_display(email)
-        formatted["summary"] = gemini_service.summarize_email(
-            email.get("body", "") or email.get("snippet", ""),
-            max_sentences=1
-        )
-        email_list.append(formatted)
+    # The digest works from snippets; only the emails we summarize need their bodies
+    top_raw = await asyncio.to_thread(
+        gmail_service.get_emails_batch, [email["id"] for email in emails[:DIGEST_TOP_EMAILS]]
+    )
     
-    # Generate digest using AI (pass emails directly - generate_digest handles formatting)
-    digest_text = gemini_service.generate_digest(emails)
+    # One Gemini call covers the digest and the summaries of the emails we display
+    digest_text, summaries = await digest_with_summaries(emails, top_raw)
     
     content = f"📅 **Today's Email Digest** ({len(emails)} emails)\n\n{digest_text}"
-    top_emails = email_list[:10]
+    top_emails = with_summaries(top_raw, summaries)
     actions = prepare_reply_actions(top_emails) if top_emails else []
     
     # Include top 10 emails and add reply actions so the user can respond directly
@@ -427,9 +712,9 @@ async def handle_reply_request(
     
     # Check if user wants replies for all emails
     if any(phrase in user_msg_lower for phrase in ["all", "these", "them", "my emails", "the emails"]):
-        emails = gmail_service.fetch_emails(max_results=5)
+        emails = await asyncio.to_thread(gmail_service.fetch_emails, max_results=5, need_body=True)
         if not emails:
-            return create_response("No emails found to generate replies for.")
+            return create_response(NO_REPLY_TARGETS)
         
         emails_data = [format_email_for_display(email) for email in emails]
         for email, email_data in zip(emails, emails_data):
@@ -440,10 +725,11 @@ async def handle_reply_request(
     # Find target email
     target_email = None
     if email_id:
-        target_email = gmail_service.get_email_by_id(email_id)
+        target_email = await asyncio.to_thread(gmail_service.get_email_by_id, email_id)
     
     if not target_email:
-        target_email = find_email_by_criteria(
+        target_email = await asyncio.to_thread(
+            find_email_by_criteria,
             gmail_service,
             email_number=params.get("email_number"),
             sender=params.get("sender"),
@@ -452,13 +738,13 @@ async def handle_reply_request(
         )
     
     if not target_email:
-        emails = gmail_service.fetch_emails(max_results=1)
+        emails = await asyncio.to_thread(gmail_service.fetch_emails, max_results=1, need_body=True)
         if not emails:
             return create_response("No emails found to reply to.")
         target_email = emails[0]
     
     # Generate reply
-    reply_text = gemini_service.generate_reply(
+    reply_text = await generate_reply_async(
         email_body=target_email.get("body", "") or target_email.get("snippet", ""),
         sender_name=target_email.get("sender_name", "the sender"),
         tone=params.get("tone", "professional"),
@@ -468,20 +754,7 @@ async def handle_reply_request(
     sender_name = target_email.get("sender_name", "Unknown")
     subject = target_email.get("subject", "No Subject")
     
-    actions = [{
-        "id": f"send-reply-{target_email['id']}",
-        "type": "send_reply",
-        "label": "Send Reply",
-        "emailId": target_email["id"],
-        "payload": {
-            "replyText": reply_text,
-            "subject": subject,
-            "sender": sender_name
-        },
-        "requiresConfirmation": True,
-        "confirmTitle": "Send Reply?",
-        "confirmDescription": f"Send this reply to {sender_name}?"
-    }]
+    actions = [send_reply_action(target_email["id"], "Send Reply", reply_text, subject, sender_name)]
     
     content = f"Here's a suggested reply to \"{subject}\" from {sender_name}:\n\n**Suggested Reply:**\n{reply_text}"
     
@@ -498,12 +771,14 @@ async def handle_delete_request(
     params: Dict
 ) -> Dict:
     """Handle delete email request"""
-    target_email = find_email_by_criteria(
+    target_email = await asyncio.to_thread(
+        find_email_by_criteria,
         gmail_service,
         email_number=params.get("email_number"),
         sender=params.get("sender"),
         subject_keywords=params.get("subject_keywords"),
-        user_message=user_message
+        user_message=user_message,
+        need_body=False
     )
     
     if not target_email:
@@ -523,18 +798,17 @@ async def handle_delete_request(
     sender_name = target_email.get("sender_name", "Unknown")
     subject = target_email.get("subject", "No Subject")
     
-    actions = [{
-        "id": f"delete-{target_email['id']}",
-        "type": "delete",
-        "label": "Move to Trash",
-        "emailId": target_email["id"],
-        "payload": {"subject": subject, "sender": sender_name},
-        "requiresConfirmation": True,
-        "confirmTitle": "Move Email to Trash?",
-        "confirmDescription": f"\"{subject}\" from {sender_name} will be moved to Trash. You can restore it from Gmail later.",
-        "confirmLabel": "Move to Trash",
-        "cancelLabel": "Cancel"
-    }]
+    actions = [make_action(
+        f"delete-{target_email['id']}",
+        "delete",
+        "Move to Trash",
+        target_email["id"],
+        {"subject": subject, "sender": sender_name},
+        confirmTitle="Move Email to Trash?",
+        confirmDescription=f"\"{subject}\" from {sender_name} will be moved to Trash. You can restore it from Gmail later.",
+        confirmLabel="Move to Trash",
+        cancelLabel="Cancel"
+    )]
     
     content = (
         f"I found the email you want to delete:\n\n"
@@ -550,70 +824,131 @@ async def handle_delete_request(
     )
 
 
-async def handle_generate_all_replies(gmail_service: GmailService, payload: Dict) -> Dict:
-    """Generate replies for multiple emails"""
+async def collect_reply_targets(gmail_service: GmailService, payload: Dict) -> Optional[List[tuple]]:
+    """
+    Emails from a generate_replies payload that have a body to reply to, as
+    (number, email_info, {"body", "sender_name"}) tuples keeping the original
+    numbering. Returns None when the payload names no emails at all.
+    """
     emails_data = payload.get("emails", [])
     email_ids = payload.get("emailIds", [])
     
     # Fetch emails by ID if needed
     if not emails_data and email_ids:
         emails_data = []
-        for email_id in email_ids:
-            email = gmail_service.get_email_by_id(email_id)
-            if email:
-                formatted = format_email_for_display(email)
-                formatted["body"] = email.get("body", "") or email.get("snippet", "")
-                emails_data.append(formatted)
+        for email in await asyncio.to_thread(gmail_service.get_emails_batch, email_ids):
+            formatted = format_email_for_display(email)
+            formatted["body"] = email.get("body", "") or email.get("snippet", "")
+            emails_data.append(formatted)
     
     if not emails_data:
-        return create_response("No emails found to generate replies for.")
-    
-    # Generate replies
-    emails_with_replies = []
-    actions = []
-    content = "Here are the suggested replies for your emails:\n\n"
+        return None
+    
+    # Fetch full emails in one batch for any whose body is missing
+    missing_ids = [
+        email_info.get("id") for email_info in emails_data
+        if not email_info.get("body") and email_info.get("id")
+    ]
+    if missing_ids:
+        fetched = {
+            email["id"]: email
+            for email in await asyncio.to_thread(gmail_service.get_emails_batch, missing_ids)
+        }
+        for email_info in emails_data:
+            email = fetched.get(email_info.get("id"))
+            if email and not email_info.get("body"):
+                email_info["body"] = email.get("body", "") or email.get("snippet", "")
     
+    pending = []
     for idx, email_info in enumerate(emails_data, 1):
-        email_id = email_info.get("id")
-        
-        # Fetch full email if body is missing
-        if not email_info.get("body"):
-            email = gmail_service.get_email_by_id(email_id)
-            if email:
-                email_info["body"] = email.get("body", "") or email.get("snippet", "")
-        
         sender_name = email_info.get("sender", {}).get("name", "Unknown") if isinstance(email_info.get("sender"), dict) else "Unknown"
         email_body = email_info.get("body", "")
         
         if not email_body:
             continue
         
-        reply_text = gemini_service.generate_reply(
-            email_body=email_body,
-            sender_name=sender_name,
-            tone="professional"
-        )
+        pending.append((idx, email_info, {"body": email_body, "sender_name": sender_name}))
+    return pending
+
+
+def build_reply_entry(idx: int, email_info: Dict, sender_name: str, reply_text: str) -> tuple:
+    """Content block and send action for one generated reply; stores the reply on email_info"""
+    email_id = email_info.get("id")
+    subject = email_info.get("subject", "No Subject")
+    email_info["replyText"] = reply_text
+    
+    content = f"**Email #{idx}: {subject}**\nFrom: {sender_name}\nSuggested Reply:\n{reply_text}\n\n"
+    return content, send_reply_action(email_id, f"Send Reply #{idx}", reply_text, subject, sender_name)
+
+
+async def handle_generate_all_replies(gmail_service: GmailService, payload: Dict) -> Dict:
+    """Generate replies for multiple emails"""
+    pending = await collect_reply_targets(gmail_service, payload)
+    if pending is None:
+        return create_response(NO_REPLY_TARGETS)
+    
+    # Generate replies
+    reply_texts = await generate_replies_async(
+        [request for _, _, request in pending], tone="professional"
+    )
+    
+    emails_with_replies = []
+    actions = []
+    parts = [REPLIES_HEADER]
+    
+    for (idx, email_info, request), reply_text in zip(pending, reply_texts):
+        content, action = build_reply_entry(idx, email_info, request["sender_name"], reply_text)
+        parts.append(content)
+        emails_with_replies.append(email_info)
+        actions.append(action)
+    
+    return create_response("".join(parts), emails_with_replies, actions)
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+async def stream_generated_replies(gmail_service: GmailService, payload: Dict):
+    """
+    Server-Sent Events for generate_replies: 'start', then one 'reply' per email
+    as soon as its small Gemini batch finishes, then 'done' carrying the same response
+    handle_generate_all_replies would return ('error' on failure)
+    """
+    try:
+        pending = await collect_reply_targets(gmail_service, payload)
+        if pending is None:
+            yield _sse("done", create_response(NO_REPLY_TARGETS))
+            return
         
-        subject = email_info.get("subject", "No Subject")
-        content += f"**Email #{idx}: {subject}**\n"
-        content += f"From: {sender_name}\n"
-        content += f"Suggested Reply:\n{reply_text}\n\n"
+        yield _sse("start", {"content": REPLIES_HEADER})
         
-        email_info["replyText"] = reply_text
-        emails_with_replies.append(email_info)
+        async def reply_chunk(chunk: List[tuple]):
+            reply_texts = await generate_replies_async(
+                [request for _, _, request in chunk], tone="professional"
+            )
+            return chunk, reply_texts
         
-        actions.append({
-            "id": f"send-reply-{email_id}",
-            "type": "send_reply",
-            "label": f"Send Reply #{idx}",
-            "emailId": email_id,
-            "payload": {"replyText": reply_text, "subject": subject, "sender": sender_name},
-            "requiresConfirmation": True,
-            "confirmTitle": "Send Reply?",
-            "confirmDescription": f"Send this reply to {sender_name}?"
-        })
-    
-    return create_response(content, emails_with_replies, actions)
+        entries = {}
+        for finished in asyncio.as_completed([
+            reply_chunk(pending[i:i + STREAM_REPLY_BATCH_SIZE])
+            for i in range(0, len(pending), STREAM_REPLY_BATCH_SIZE)
+        ]):
+            chunk, reply_texts = await finished
+            for (idx, email_info, request), reply_text in zip(chunk, reply_texts):
+                content, action = build_reply_entry(idx, email_info, request["sender_name"], reply_text)
+                entries[idx] = (email_info, content, action)
+                yield _sse("reply", {"content": content, "email": email_info, "action": action})
+        
+        ordered = [entries[idx] for idx in sorted(entries)]
+        yield _sse("done", create_response(
+            REPLIES_HEADER + "".join(content for _, content, _ in ordered),
+            [email_info for email_info, _, _ in ordered],
+            [action for _, _, action in ordered]
+        ))
+    except Exception as e:
+        print(f"Error streaming replies: {e}")
+        yield _sse("error", {"detail": f"Failed to generate replies: {str(e)}"})
 
 
 async def handle_send_reply(gmail_service: GmailService, email_id: str, payload: Dict) -> Dict:
@@ -623,7 +958,7 @@ async def handle_send_reply(gmail_service: GmailService, email_id: str, payload:
         raise HTTPException(status_code=400, detail="Reply text is required")
     
     try:
-        gmail_service.send_reply(email_id, reply_text)
+        await asyncio.to_thread(gmail_service.send_reply, email_id, reply_text)
         return create_response("✅ Reply sent successfully! Your message has been delivered.")
     except Exception as e:
         return create_response(f"❌ Failed to send reply: {str(e)}")
@@ -632,7 +967,7 @@ async def handle_send_reply(gmail_service: GmailService, email_id: str, payload:
 async def handle_delete_email(gmail_service: GmailService, email_id: str) -> Dict:
     """Move an email to trash"""
     try:
-        gmail_service.trash_email(email_id)
+        await asyncio.to_thread(gmail_service.trash_email, email_id)
         return create_response("🗑️ Email moved to Trash. You can restore it from Gmail if needed.")
     except Exception as e:
         return create_response(f"❌ Failed to move email to Trash: {str(e)}")
@@ -646,11 +981,11 @@ async def handle_search_emails(gmail_service: GmailService, params: Dict) -> Dic
     if not query:
         return await handle_read_emails(gmail_service, {"count": count})
     
-    emails = gmail_service.search_emails(query, max_results=count)
+    emails = await asyncio.to_thread(gmail_service.search_emails, query, max_results=count, need_body=True)
     if not emails:
         return create_response(f"No emails found matching your search: {query}")
     
-    emails_with_summaries = enrich_emails_with_summaries(emails)
+    emails_with_summaries = await enrich_emails_with_summaries(emails)
     
     # Keep text concise; detailed info comes from the email cards.
     content = f"I found {len(emails_with_summaries)} email(s) matching your search. Here they are:"
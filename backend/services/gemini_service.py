@@ -1,9 +1,163 @@
 # Gemini service
 import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+import asyncio
 import os
 import json
+import orjson
+import random
+from functools import lru_cache
 from typing import Dict, List, Optional
 
+from utils.rate_limit import TokenBucket
+from utils.response_cache import ResponseCache, cache_key
+
+# Optional JSONL file that keeps Gemini responses across restarts. Responses
+# quote and summarize users' emails, so persistence is opt-in.
+GEMINI_CACHE_PATH = os.getenv("GEMINI_CACHE_PATH")
+GEMINI_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "4096"))
+
+# Requests per minute allowed by the Gemini tier; calls beyond it wait for a
+# token instead of being rejected with 429
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+
+# 429s and 503s are retried with full-jitter exponential backoff
+GEMINI_MAX_ATTEMPTS = 6
+BACKOFF_MIN_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# A response that isn't valid JSON is re-requested once; bad output is usually not repeated
+JSON_MAX_ATTEMPTS = 2
+JSON_RETRY_SECONDS = 0.2
+
+# Returned when Gemini fails; callers use these to avoid caching a failure
+SUMMARY_FALLBACK = "Unable to generate summary"
+REPLY_FALLBACK = "I'd be happy to help. Could you provide more details?"
+DIGEST_FALLBACK = "Daily Digest: You have {count} emails. Unable to generate detailed summary."
+
+TONE_INSTRUCTIONS = {
+    "professional": "Write a professional and courteous reply.",
+    "friendly": "Write a warm and friendly reply.",
+    "brief": "Write a very brief reply (1-2 sentences)."
+}
+
+# Clear guidance for the model about what a good reply should look like.
+REPLY_GUIDELINES = """Write a reply that is:
+- Context aware (based directly on the original email content)
+- Clear and professional
+- Ready to send as-is (no placeholders like "[YOUR NAME]" or "[INSERT DETAILS]")
+- Action-oriented where appropriate (e.g., next steps, confirmations, or follow-ups)
+- Polite and concise, avoiding unnecessary repetition of the original email"""
+
+REPLY_FORMAT_RULES = """Do not include greetings like "Dear..." or signatures. 
+Do not add your own sign-off/signature. Be helpful, specific, and concise."""
+
+GEMINI_MODEL = 'gemini-2.0-flash-lite'
+
+DIGEST_SECTIONS = """Include:
+1. Quick overview (how many emails, general themes)
+2. Key emails that need attention (list 3-5 most important)
+3. Suggested actions or follow-ups
+4. Any urgent matters
+
+Format in clear sections with headers. Be concise but informative."""
+
+# Fixed instructions for the single-purpose prompts. They go to Gemini as the
+# system instruction of a per-task model, so each request carries only the
+# emails or command as its prompt and every request of a task starts with an
+# identical, cacheable prefix.
+COMMAND_INSTRUCTIONS = """Parse the user's email command into structured JSON.
+
+Return ONLY valid JSON in this exact format:
+{
+  "action": "read" | "reply" | "delete" | "search" | "digest" | "categorize" | "unknown",
+  "parameters": {
+    "count": 5,
+    "query": "",
+    "sender": "",
+    "subject_keywords": [],
+    "email_number": null,
+    "tone": "professional",
+    "reply_context": ""
+  }
+}
+
+Rules:
+- action "read": Show/list/display emails
+- action "reply": Generate/write reply
+- action "delete": Remove/trash emails
+- action "search": Find specific emails
+- action "digest": Summary/overview of emails (daily digest, today's digest)
+- action "categorize": Group/categorize/group emails into categories
+- Extract numbers for "count" or "email_number"
+- Extract sender names/emails for "sender"
+- Extract keywords from subject mentions"""
+
+CATEGORIZE_INSTRUCTIONS = """Categorize the user's emails into appropriate categories.
+
+Return ONLY valid JSON in this format:
+{
+  "urgent": ["email_id1", "email_id2"],
+  "work": ["email_id3"],
+  "personal": ["email_id4"],
+  "promotions": ["email_id5"],
+  "other": ["email_id6"]
+}
+
+Categories:
+- urgent: Requires immediate attention, deadlines, important
+- work: Work-related, professional correspondence
+- personal: Personal messages from individuals
+- promotions: Marketing, newsletters, promotional content
+- other: Everything else"""
+
+DIGEST_INSTRUCTIONS = f"""Create a comprehensive daily email digest from the user's emails.
+
+{DIGEST_SECTIONS}"""
+
+SENTIMENT_INSTRUCTIONS = """Analyze the sentiment of the user's emails. Describe each email as a JSON object:
+{
+  "sentiment": "positive" | "negative" | "neutral",
+  "confidence": 0.0 to 1.0,
+  "reasoning": "brief explanation"
+}"""
+
+TASK_INSTRUCTIONS = {
+    "command": COMMAND_INSTRUCTIONS,
+    "categorize": CATEGORIZE_INSTRUCTIONS,
+    "digest": DIGEST_INSTRUCTIONS,
+    "sentiment": SENTIMENT_INSTRUCTIONS,
+}
+
+
+# Static prompt heads and tails, built once; per call only the email is spliced in
+REPLY_PROMPT_HEADS = {
+    tone: f"{instruction}\n\n{REPLY_GUIDELINES}\n\nOriginal email from "
+    for tone, instruction in TONE_INSTRUCTIONS.items()
+}
+REPLY_PROMPT_TAIL = f"\n\nWrite only the reply body. {REPLY_FORMAT_RULES}\n\nReply:"
+SUMMARY_PROMPT_TAIL = "\n\nSummary:"
+
+
+@lru_cache(maxsize=16)
+def summary_prompt_head(max_sentences: int) -> str:
+    """Summary prompt up to the email body"""
+    return (
+        f"Summarize this email in {max_sentences} sentences or less. \n"
+        "Be concise and highlight the main point or action needed.\n\n"
+        "Email:\n"
+    )
+
+
+def normalize_command(user_input: str) -> str:
+    """
+    Case, spacing and trailing punctuation don't change what a command means,
+    so "Show my emails!" and "show  my emails" share a parse_command result.
+    Words and numbers are kept as-is: "delete email 2" and "delete email 3"
+    must never share one.
+    """
+    return " ".join(user_input.lower().split()).rstrip(".!?")
+
 
 class GeminiService:
     """Gemini AI operations"""
@@ -15,9 +169,128 @@ class GeminiService:
             raise ValueError("GEMINI_API_KEY not found in environment")
         
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        self.model = genai.GenerativeModel(GEMINI_MODEL)
+        self._task_models = {
+            task: genai.GenerativeModel(GEMINI_MODEL, system_instruction=instructions)
+            for task, instructions in TASK_INSTRUCTIONS.items()
+        }
+        self._cache = ResponseCache(GEMINI_CACHE_SIZE, GEMINI_CACHE_PATH)
+        self._bucket = TokenBucket(rate=GEMINI_RPM / 60, capacity=GEMINI_RPM)
+        # Gemini calls in progress by cache key, so concurrent identical requests share one call
+        self._inflight: Dict[str, asyncio.Task] = {}
+    
+    async def _call_model(self, prompt: str, task: Optional[str] = None):
+        """
+        generate_content_async paced by the RPM token bucket, retrying rate-limit
+        and overload errors with jittered exponential backoff. Other errors
+        (invalid arguments, blocked prompts) are raised immediately.
+        """
+        for attempt in range(1, GEMINI_MAX_ATTEMPTS + 1):
+            while wait := self._bucket.consume():
+                await asyncio.sleep(wait)
+            try:
+                model = self._task_models[task] if task else self.model
+                return await model.generate_content_async(prompt)
+            except (ResourceExhausted, ServiceUnavailable) as e:
+                if attempt == GEMINI_MAX_ATTEMPTS:
+                    raise
+                delay = random.uniform(
+                    BACKOFF_MIN_SECONDS,
+                    min(BACKOFF_MAX_SECONDS, BACKOFF_MIN_SECONDS * 2 ** attempt)
+                )
+                print(f"Gemini rate limited (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+    
+    async def _generate(self, prompt: str, key: Optional[str] = None, task: Optional[str] = None) -> str:
+        """
+        Response text for a prompt, served from the response cache when possible
+        
+        Args:
+            prompt: Prompt to send to Gemini
+            key: Cache key; defaults to a hash of the task and prompt. Callers pass
+                their own when equivalent inputs can produce different prompts.
+            task: TASK_INSTRUCTIONS entry to send as the system instruction
+        """
+        key = key or cache_key(task or "", prompt)
+        text = self._cache.get(key)
+        if text is not None:
+            return text
+        
+        call = self._inflight.get(key)
+        if call is None:
+            call = self._inflight[key] = asyncio.ensure_future(self._generate_uncached(prompt, key, task))
+        # Shielded so a caller that gives up doesn't cancel the call for the others waiting on it
+        return await asyncio.shield(call)
+    
+    async def _generate_uncached(self, prompt: str, key: str, task: Optional[str]) -> str:
+        """Call Gemini and cache the response text; runs once per in-flight key"""
+        try:
+            response = await self._call_model(prompt, task)
+            text = response.text.strip()
+            self._cache.set(key, text)
+            return text
+        finally:
+            self._inflight.pop(key, None)
     
-    def summarize_email(self, email_body: str, max_sentences: int = 2) -> str:
+    async def _generate_json(self, prompt: str, key: Optional[str] = None, validate=None, task: Optional[str] = None):
+        """
+        Like _generate, but parses the response as JSON. Responses that don't
+        parse, or that fail the optional validate(result) check, are dropped
+        from the cache and requested again, raising ValueError if the retry
+        fails too.
+        """
+        key = key or cache_key(task or "", prompt)
+        for attempt in range(1, JSON_MAX_ATTEMPTS + 1):
+            json_text = await self._generate(prompt, key, task)
+            
+            # Clean markdown formatting if present
+            json_text = json_text.replace('```json', '').replace('```', '').strip()
+            try:
+                result = json.loads(json_text)
+                if validate and not validate(result):
+                    raise ValueError(f"unexpected response shape: {json_text:.100}")
+                return result
+            except ValueError:
+                self._cache.discard(key)
+                if attempt == JSON_MAX_ATTEMPTS:
+                    raise
+                await asyncio.sleep(JSON_RETRY_SECONDS)
+    
+    @staticmethod
+    def _summary_key(email_body: str, max_sentences: int) -> str:
+        # Bodies that differ only in whitespace (re-wrapped lines, trailing blanks) share a summary
+        return cache_key("summary", str(max_sentences), " ".join(email_body.split()))
+    
+    @staticmethod
+    def _reply_key(email_body: str, sender_name: str, tone: str, context: Optional[str]) -> str:
+        tone = tone if tone in TONE_INSTRUCTIONS else "professional"
+        return cache_key("reply", tone, sender_name, context or "", " ".join(email_body.split()))
+    
+    def _digest_key(self, emails: List[Dict]) -> str:
+        # Same emails in another order make the same digest
+        return cache_key("digest", *sorted(
+            json.dumps(email, sort_keys=True) for email in self._digest_email_data(emails)
+        ))
+    
+    def cached_summary(self, email_body: str, max_sentences: int = 2) -> Optional[str]:
+        """Cached summarize_email result, or None; lets callers skip queueing for a call"""
+        return self._cache.get(self._summary_key(email_body, max_sentences))
+    
+    def cached_reply(
+        self,
+        email_body: str,
+        sender_name: str,
+        tone: str = "professional",
+        context: str = None
+    ) -> Optional[str]:
+        """Cached generate_reply result, or None"""
+        return self._cache.get(self._reply_key(email_body, sender_name, tone, context))
+    
+    def cached_digest(self, emails: List[Dict]) -> Optional[str]:
+        """Cached generate_digest result, or None"""
+        return self._cache.get(self._digest_key(emails))
+    
+    async def summarize_email(self, email_body: str, max_sentences: int = 2) -> str:
         """
         Summarize email content
         
@@ -28,22 +301,15 @@ class GeminiService:
         Returns:
             Concise summary
         """
-        prompt = f"""Summarize this email in {max_sentences} sentences or less. 
-Be concise and highlight the main point or action needed.
-
-Email:
-{email_body}
-
-Summary:"""
+        prompt = summary_prompt_head(max_sentences) + email_body + SUMMARY_PROMPT_TAIL
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return await self._generate(prompt, self._summary_key(email_body, max_sentences))
         except Exception as e:
             print(f"Gemini summarization error: {e}")
-            return "Unable to generate summary"
+            return SUMMARY_FALLBACK
     
-    def generate_reply(
+    async def generate_reply(
         self, 
         email_body: str, 
         sender_name: str, 
@@ -62,42 +328,97 @@ Summary:"""
         Returns:
             Generated reply text
         """
-        tone_instructions = {
-            "professional": "Write a professional and courteous reply.",
-            "friendly": "Write a warm and friendly reply.",
-            "brief": "Write a very brief reply (1-2 sentences)."
-        }
+        head = REPLY_PROMPT_HEADS.get(tone, REPLY_PROMPT_HEADS["professional"])
+        additional = f"Additional context: {context}" if context else ""
+        prompt = f"{head}{sender_name}:\n{email_body}\n\n{additional}{REPLY_PROMPT_TAIL}"
         
-        instruction = tone_instructions.get(tone, tone_instructions["professional"])
+        try:
+            return await self._generate(prompt, self._reply_key(email_body, sender_name, tone, context))
+        except Exception as e:
+            print(f"Gemini reply generation error: {e}")
+            return REPLY_FALLBACK
+    
+    async def summarize_emails_batch(self, email_bodies: List[str], max_sentences: int = 2) -> Optional[List[str]]:
+        """
+        Summarize several emails with a single Gemini call
         
-        # Clear guidance for the model about what a good reply should look like.
-        prompt = f"""{instruction}
+        Args:
+            email_bodies: Full text of each email
+            max_sentences: Maximum sentences per summary
+        
+        Returns:
+            One summary per email in input order, or None if the response
+            could not be parsed (callers fall back to summarize_email).
+            Each summary is also cached as that email's summarize_email result.
+        """
+        emails_text = self._numbered_emails(email_bodies)
+        
+        prompt = f"""Summarize each of these {len(email_bodies)} emails in {max_sentences} sentences or less.
+Be concise and highlight the main point or action needed.
 
-Write a reply that is:
-- Context aware (based directly on the original email content)
-- Clear and professional
-- Ready to send as-is (no placeholders like "[YOUR NAME]" or "[INSERT DETAILS]")
-- Action-oriented where appropriate (e.g., next steps, confirmations, or follow-ups)
-- Polite and concise, avoiding unnecessary repetition of the original email
+{emails_text}
 
-Original email from {sender_name}:
-{email_body}
+Return ONLY a valid JSON array of {len(email_bodies)} strings: one summary per email, in the same order.
 
-{f'Additional context: {context}' if context else ''}
+JSON:"""
+        
+        summaries = await self._generate_json_list(prompt, len(email_bodies), "summarization")
+        if summaries is not None:
+            for body, summary in zip(email_bodies, summaries):
+                self._cache.set(self._summary_key(body, max_sentences), summary)
+        return summaries
+    
+    async def generate_replies_batch(self, emails: List[Dict], tone: str = "professional") -> Optional[List[str]]:
+        """
+        Generate replies for several emails with a single Gemini call
+        
+        Args:
+            emails: List of dicts with 'body' and 'sender_name'
+            tone: Reply tone (professional, friendly, brief)
+        
+        Returns:
+            One reply per email in input order, or None if the response
+            could not be parsed (callers fall back to generate_reply).
+            Each reply is also cached as that email's generate_reply result.
+        """
+        instruction = TONE_INSTRUCTIONS.get(tone, TONE_INSTRUCTIONS["professional"])
+        emails_text = "\n\n".join(
+            f"--- Email {idx} from {email.get('sender_name', 'the sender')} ---\n{email.get('body', '')}"
+            for idx, email in enumerate(emails, 1)
+        )
+        
+        prompt = f"""{instruction} Do this for each of the {len(emails)} emails below.
+
+{REPLY_GUIDELINES}
 
-Write only the reply body. Do not include greetings like "Dear..." or signatures. 
-Do not add your own sign-off/signature. Be helpful, specific, and concise.
+{emails_text}
 
-Reply:"""
+Each reply is only the reply body. {REPLY_FORMAT_RULES}
+
+Return ONLY a valid JSON array of {len(emails)} strings: one reply per email, in the same order.
+
+JSON:"""
         
+        replies = await self._generate_json_list(prompt, len(emails), "batch reply")
+        if replies is not None:
+            for email, reply in zip(emails, replies):
+                key = self._reply_key(email.get('body', ''), email.get('sender_name', 'the sender'), tone, None)
+                self._cache.set(key, reply)
+        return replies
+    
+    async def _generate_json_list(self, prompt: str, expected_len: int, label: str) -> Optional[List[str]]:
+        """Run a prompt that must return a JSON array of exactly expected_len strings"""
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            items = await self._generate_json(
+                prompt,
+                validate=lambda items: isinstance(items, list) and len(items) == expected_len
+            )
+            return [str(item).strip() for item in items]
         except Exception as e:
-            print(f"Gemini reply generation error: {e}")
-            return "I'd be happy to help. Could you provide more details?"
+            print(f"Gemini {label} error: {e}")
+            return None
     
-    def parse_command(self, user_input: str) -> Dict:
+    async def parse_command(self, user_input: str) -> Dict:
         """
         Parse natural language command into structured action
         
@@ -107,46 +428,14 @@ Reply:"""
         Returns:
             Dictionary with action type and parameters
         """
-        prompt = f"""Parse this email command into structured JSON.
-
-Command: "{user_input}"
-
-Return ONLY valid JSON in this exact format:
-{{
-  "action": "read" | "reply" | "delete" | "search" | "digest" | "categorize" | "unknown",
-  "parameters": {{
-    "count": 5,
-    "query": "",
-    "sender": "",
-    "subject_keywords": [],
-    "email_number": null,
-    "tone": "professional",
-    "reply_context": ""
-  }}
-}}
-
-Rules:
-- action "read": Show/list/display emails
-- action "reply": Generate/write reply
-- action "delete": Remove/trash emails
-- action "search": Find specific emails
-- action "digest": Summary/overview of emails (daily digest, today's digest)
-- action "categorize": Group/categorize/group emails into categories
-- Extract numbers for "count" or "email_number"
-- Extract sender names/emails for "sender"
-- Extract keywords from subject mentions
+        prompt = f"""Command: "{user_input}"
 
 JSON:"""
         
         try:
-            response = self.model.generate_content(prompt)
-            json_text = response.text.strip()
-            
-            # Clean markdown formatting if present
-            json_text = json_text.replace('```json', '').replace('```', '').strip()
-            
-            parsed = json.loads(json_text)
-            return parsed
+            return await self._generate_json(
+                prompt, cache_key("command", normalize_command(user_input)), task="command"
+            )
         except Exception as e:
             print(f"Gemini command parsing error: {e}")
             # Return default structure
@@ -158,7 +447,7 @@ JSON:"""
                 }
             }
     
-    def categorize_emails(self, emails: List[Dict]) -> Dict[str, List[str]]:
+    async def categorize_emails(self, emails: List[Dict]) -> Dict[str, List[str]]:
         """
         Categorize emails into groups
         
@@ -178,42 +467,24 @@ JSON:"""
                 'preview': email.get('snippet', '')[:100]
             })
         
-        prompt = f"""Categorize these {len(emails)} emails into appropriate categories.
+        prompt = f"""Categorize these {len(emails)} emails.
 
 Emails:
-{json.dumps(email_summaries, indent=2)}
-
-Return ONLY valid JSON in this format:
-{{
-  "urgent": ["email_id1", "email_id2"],
-  "work": ["email_id3"],
-  "personal": ["email_id4"],
-  "promotions": ["email_id5"],
-  "other": ["email_id6"]
-}}
-
-Categories:
-- urgent: Requires immediate attention, deadlines, important
-- work: Work-related, professional correspondence
-- personal: Personal messages from individuals
-- promotions: Marketing, newsletters, promotional content
-- other: Everything else
+{orjson.dumps(email_summaries).decode()}
 
 JSON:"""
         
+        # The categories don't depend on email order, so key on the sorted payload
+        key = cache_key("categorize", json.dumps(sorted(email_summaries, key=lambda e: e['id']), sort_keys=True))
+        
         try:
-            response = self.model.generate_content(prompt)
-            json_text = response.text.strip()
-            json_text = json_text.replace('```json', '').replace('```', '').strip()
-            
-            categories = json.loads(json_text)
-            return categories
+            return await self._generate_json(prompt, key, task="categorize")
         except Exception as e:
             print(f"Gemini categorization error: {e}")
             # Return all as "other"
             return {"other": [email['id'] for email in emails]}
     
-    def generate_digest(self, emails: List[Dict]) -> str:
+    async def generate_digest(self, emails: List[Dict]) -> str:
         """
         Generate daily digest summary
         
@@ -223,38 +494,87 @@ JSON:"""
         Returns:
             Formatted digest text
         """
-        # Prepare email data
-        email_data = []
-        for email in emails:
-            email_data.append({
-                'from': email.get('sender_name', email.get('sender', 'Unknown')),
-                'subject': email.get('subject', 'No Subject'),
-                'preview': email.get('snippet', '')[:150]
-            })
+        email_data = self._digest_email_data(emails)
+        prompt = f"""Create the digest from these {len(emails)} emails.
+
+Emails:
+{orjson.dumps(email_data).decode()}
+
+Digest:"""
+        
+        try:
+            return await self._generate(prompt, self._digest_key(emails), task="digest")
+        except Exception as e:
+            print(f"Gemini digest generation error: {e}")
+            return DIGEST_FALLBACK.format(count=len(emails))
+    
+    async def generate_digest_with_summaries(self, emails: List[Dict], summary_bodies: List[str]) -> Optional[Dict]:
+        """
+        Generate the daily digest and one-sentence summaries in a single call
+        
+        Args:
+            emails: All emails the digest covers
+            summary_bodies: Bodies of the emails to summarize individually
+        
+        Returns:
+            Dict with 'digest' text and a 'summaries' list matching summary_bodies,
+            or None if the response could not be parsed (callers fall back to
+            generate_digest and summarize_email). The parts are also cached as
+            the generate_digest and one-sentence summarize_email results.
+        """
+        bodies_text = self._numbered_emails(summary_bodies)
         
-        prompt = f"""Create a comprehensive daily email digest from these {len(emails)} emails.
+        prompt = f"""Create the digest from these {len(emails)} emails.
 
 Emails:
-{json.dumps(email_data, indent=2)}
+{orjson.dumps(self._digest_email_data(emails)).decode()}
 
-Include:
-1. Quick overview (how many emails, general themes)
-2. Key emails that need attention (list 3-5 most important)
-3. Suggested actions or follow-ups
-4. Any urgent matters
+Also summarize each of these {len(summary_bodies)} emails in 1 sentence, highlighting the main point or action needed:
 
-Format in clear sections with headers. Be concise but informative.
+{bodies_text}
 
-Digest:"""
+Return ONLY valid JSON in this format:
+{{
+  "digest": "the full digest text",
+  "summaries": ["one summary per email above, in the same order"]
+}}
+
+JSON:"""
+        
+        def valid(result) -> bool:
+            return (
+                isinstance(result, dict)
+                and isinstance(result.get("digest"), str)
+                and isinstance(result.get("summaries"), list)
+                and len(result["summaries"]) == len(summary_bodies)
+            )
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            result = await self._generate_json(prompt, validate=valid, task="digest")
         except Exception as e:
-            print(f"Gemini digest generation error: {e}")
-            return f"Daily Digest: You have {len(emails)} emails. Unable to generate detailed summary."
+            print(f"Gemini digest with summaries error: {e}")
+            return None
+        
+        digest = result["digest"].strip()
+        summaries = [str(summary).strip() for summary in result["summaries"]]
+        self._cache.set(self._digest_key(emails), digest)
+        for body, summary in zip(summary_bodies, summaries):
+            self._cache.set(self._summary_key(body, 1), summary)
+        return {"digest": digest, "summaries": summaries}
+    
+    @staticmethod
+    def _digest_email_data(emails: List[Dict]) -> List[Dict]:
+        """Sender, subject and preview of each email for digest prompts"""
+        return [
+            {
+                'from': email.get('sender_name', email.get('sender', 'Unknown')),
+                'subject': email.get('subject', 'No Subject'),
+                'preview': email.get('snippet', '')[:150]
+            }
+            for email in emails
+        ]
     
-    def analyze_sentiment(self, email_body: str) -> Dict:
+    async def analyze_sentiment(self, email_body: str) -> Dict:
         """
         Analyze email sentiment
         
@@ -264,26 +584,15 @@ Digest:"""
         Returns:
             Sentiment analysis (positive, negative, neutral) with confidence
         """
-        prompt = f"""Analyze the sentiment of this email.
-
-Email:
+        prompt = f"""Email:
 {email_body}
 
-Return ONLY valid JSON:
-{{
-  "sentiment": "positive" | "negative" | "neutral",
-  "confidence": 0.0 to 1.0,
-  "reasoning": "brief explanation"
-}}
+Return ONLY the valid JSON object for this email.
 
 JSON:"""
         
         try:
-            response = self.model.generate_content(prompt)
-            json_text = response.text.strip()
-            json_text = json_text.replace('```json', '').replace('```', '').strip()
-            
-            return json.loads(json_text)
+            return await self._generate_json(prompt, task="sentiment")
         except Exception as e:
             print(f"Gemini sentiment analysis error: {e}")
             return {
@@ -291,3 +600,41 @@ JSON:"""
                 "confidence": 0.5,
                 "reasoning": "Unable to analyze"
             }
+    
+    async def analyze_sentiments_batch(self, email_bodies: List[str]) -> Optional[List[Dict]]:
+        """
+        Analyze the sentiment of several emails with a single Gemini call
+        
+        Args:
+            email_bodies: Email contents
+        
+        Returns:
+            One analysis per email in input order, or None if the response
+            could not be parsed (callers fall back to analyze_sentiment)
+        """
+        prompt = f"""{self._numbered_emails(email_bodies)}
+
+Return ONLY a valid JSON array with one object per email, in the same order.
+
+JSON:"""
+        
+        try:
+            return await self._generate_json(
+                prompt,
+                task="sentiment",
+                validate=lambda items: (
+                    isinstance(items, list)
+                    and len(items) == len(email_bodies)
+                    and all(isinstance(item, dict) for item in items)
+                )
+            )
+        except Exception as e:
+            print(f"Gemini batch sentiment analysis error: {e}")
+            return None
+    
+    @staticmethod
+    def _numbered_emails(email_bodies: List[str]) -> str:
+        """Email bodies separated by numbered delimiters for multi-email prompts"""
+        return "\n\n".join(
+            f"--- Email {idx} ---\n{body}" for idx, body in enumerate(email_bodies, 1)
+        )
@@ -5,29 +5,79 @@ Handles all Gmail operations: fetch, send, delete emails
 """
 
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 from googleapiclient.errors import HttpError
+from selectolax.lexbor import LexborHTMLParser
 from email.mime.text import MIMEText
+from email.utils import parseaddr
+from functools import lru_cache
 import base64
+import json
 from typing import List, Dict, Optional
+import pybase64
 import re
 
 
+# Gmail accepts at most 100 calls per batch request
+BATCH_SIZE = 100
+
+# Headers and partial-response mask for listings that don't need message bodies
+METADATA_HEADERS = ['From', 'To', 'Subject', 'Date']
+METADATA_FIELDS = 'id,threadId,snippet,labelIds,payload/headers'
+
+CHARSET_RE = re.compile(r'charset="?([\w.:-]+)', re.IGNORECASE)
+
+
+def b64url_decode(data: str) -> bytes:
+    """Decode Gmail's base64url body data, padded or not"""
+    # SIMD decoder, several times faster on large inline parts
+    return pybase64.b64decode(data + '=' * (-len(data) % 4), altchars=b'-_', validate=False)
+
+
+@lru_cache(maxsize=4096)
+def _parse_sender_cached(sender: str) -> tuple:
+    """(name, email) from a 'Name <email>' header; inboxes repeat the same senders"""
+    name, email = parseaddr(sender)
+    # parseaddr('Unknown Sender') gives ('', 'Unknown'); only trust real addresses
+    if '@' not in email:
+        return sender, sender
+    return name or email, email
+
+
+def html_to_text(raw: bytes) -> str:
+    """Visible text of an HTML email body, without scripts and styles"""
+    tree = LexborHTMLParser(raw)
+    tree.strip_tags(['script', 'style'])
+    root = tree.body or tree.root
+    return root.text(separator=' ', strip=True) if root else ''
+
+
+@lru_cache(maxsize=1)
+def gmail_discovery_document() -> Dict:
+    """Gmail v1 discovery document bundled with googleapiclient, parsed once per process"""
+    return json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+
+
 class GmailService:
     """Gmail API operations"""
     
     def __init__(self, credentials: Credentials):
         """Initialize Gmail service with user credentials"""
-        self.service = build('gmail', 'v1', credentials=credentials)
+        # Reuse the parsed discovery document; build() would re-read and re-parse ~200 KB of JSON per request.
+        # Each request still gets its own Resource, since the underlying httplib2 client isn't thread-safe.
+        self.service = build_from_document(gmail_discovery_document(), credentials=credentials)
         self.user_id = 'me'
     
-    def fetch_emails(self, max_results: int = 5, query: str = "") -> List[Dict]:
+    def fetch_emails(self, max_results: int = 5, query: str = "", need_body: bool = False) -> List[Dict]:
         """
         Fetch emails from inbox
         
         Args:
             max_results: Number of emails to fetch (default: 5)
             query: Gmail search query (e.g., "is:unread", "from:john@example.com")
+            need_body: Fetch full messages; otherwise only headers and snippet
+                are requested and 'body' is empty
         
         Returns:
             List of email dictionaries with id, sender, subject, body, date
@@ -45,116 +95,208 @@ class GmailService:
             if not messages:
                 return []
             
-            # Fetch full details for each message
-            emails = []
-            for message in messages:
-                email_data = self._get_email_details(message['id'])
-                if email_data:
-                    emails.append(email_data)
-            
-            return emails
+            # Fetch full details in batch requests instead of one round-trip per message
+            return self.get_emails_batch([message['id'] for message in messages], need_body)
             
         except HttpError as error:
             print(f"Gmail API error: {error}")
             raise Exception(f"Failed to fetch emails: {str(error)}")
     
-    def get_email_by_id(self, message_id: str) -> Optional[Dict]:
+    def fetch_nth_email_id(self, n: int, query: str = "") -> Optional[str]:
+        """
+        Get the ID of the nth most recent email without fetching any message bodies
+        
+        Args:
+            n: 1-based position in the inbox listing
+            query: Gmail search query
+        
+        Returns:
+            Message ID, or None if fewer than n emails match
+        """
+        try:
+            results = self.service.users().messages().list(
+                userId=self.user_id,
+                maxResults=n,
+                q=query
+            ).execute()
+        except HttpError as error:
+            print(f"Gmail API error: {error}")
+            raise Exception(f"Failed to fetch emails: {str(error)}")
+        
+        messages = results.get('messages', [])
+        if len(messages) < n:
+            return None
+        return messages[n - 1]['id']
+    
+    def get_email_by_id(self, message_id: str, need_body: bool = True) -> Optional[Dict]:
         """
         Get a single email by its ID
         
         Args:
             message_id: Email message ID
+            need_body: Fetch the full message; otherwise only headers and snippet
         
         Returns:
             Email dictionary or None if not found
         """
-        return self._get_email_details(message_id)
+        return self._get_email_details(message_id, need_body)
+    
+    def get_emails_batch(self, message_ids: List[str], need_body: bool = True) -> List[Dict]:
+        """
+        Get several emails using Gmail batch requests (one HTTP round-trip per 100 IDs)
+        
+        Args:
+            message_ids: Email message IDs
+            need_body: Fetch full messages; otherwise only headers and snippet
+        
+        Returns:
+            Email dictionaries in the order of message_ids; IDs that fail are skipped
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        messages = {}
+        
+        def collect(request_id, response, exception):
+            if exception is not None:
+                print(f"Error fetching email {request_id}: {exception}")
+            else:
+                messages[request_id] = response
+        
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=collect)
+            for message_id in message_ids[start:start + BATCH_SIZE]:
+                batch.add(self._get_message_request(message_id, need_body), request_id=message_id)
+            try:
+                batch.execute()
+            except HttpError as error:
+                print(f"Gmail batch error: {error}")
+        
+        return [
+            self._format_message(message_id, messages[message_id], need_body)
+            for message_id in message_ids
+            if message_id in messages
+        ]
+    
+    def _get_message_request(self, message_id: str, need_body: bool = True):
+        """messages.get request for a full message, or for its headers and snippet only"""
+        messages = self.service.users().messages()
+        if need_body:
+            return messages.get(userId=self.user_id, id=message_id, format='full')
+        return messages.get(
+            userId=self.user_id,
+            id=message_id,
+            format='metadata',
+            metadataHeaders=METADATA_HEADERS,
+            fields=METADATA_FIELDS
+        )
     
-    def _get_email_details(self, message_id: str) -> Optional[Dict]:
+    def _get_email_details(self, message_id: str, need_body: bool = True) -> Optional[Dict]:
         """Get detailed information for a specific email"""
         try:
-            message = self.service.users().messages().get(
-                userId=self.user_id,
-                id=message_id,
-                format='full'
-            ).execute()
-            
-            headers = message['payload'].get('headers', [])
+            message = self._get_message_request(message_id, need_body).execute()
             
-            # Extract headers
-            subject = self._get_header(headers, 'Subject') or '(No Subject)'
-            sender = self._get_header(headers, 'From') or 'Unknown Sender'
-            date = self._get_header(headers, 'Date') or ''
-            to = self._get_header(headers, 'To') or ''
-            
-            # Extract body
-            body = self._extract_body(message['payload'])
-            
-            # Parse sender name and email
-            sender_name, sender_email = self._parse_sender(sender)
-            
-            return {
-                'id': message_id,
-                'thread_id': message.get('threadId'),
-                'subject': subject,
-                'sender': sender,
-                'sender_name': sender_name,
-                'sender_email': sender_email,
-                'to': to,
-                'date': date,
-                'body': body,
-                'snippet': message.get('snippet', ''),
-                'labels': message.get('labelIds', []),
-                'unread': 'UNREAD' in message.get('labelIds', [])
-            }
+            return self._format_message(message_id, message, need_body)
             
         except HttpError as error:
             print(f"Error fetching email {message_id}: {error}")
             return None
     
+    def _format_message(self, message_id: str, message: Dict, need_body: bool = True) -> Dict:
+        """Build the email dictionary from a Gmail API message resource"""
+        headers = message['payload'].get('headers', [])
+        
+        # Extract headers
+        header_map = self._header_map(headers)
+        subject = header_map.get('subject') or '(No Subject)'
+        sender = header_map.get('from') or 'Unknown Sender'
+        date = header_map.get('date') or ''
+        to = header_map.get('to') or ''
+        
+        # Extract body
+        body = (self._extract_body(message['payload']) or message.get('snippet', '')) if need_body else ''
+        
+        # Parse sender name and email
+        sender_name, sender_email = self._parse_sender(sender)
+        
+        return {
+            'id': message_id,
+            'thread_id': message.get('threadId'),
+            'subject': subject,
+            'sender': sender,
+            'sender_name': sender_name,
+            'sender_email': sender_email,
+            'to': to,
+            'date': date,
+            'body': body,
+            'snippet': message.get('snippet', ''),
+            'labels': message.get('labelIds', []),
+            'unread': 'UNREAD' in message.get('labelIds', [])
+        }
+    
+    def _header_map(self, headers: List[Dict]) -> Dict[str, str]:
+        """Header values by lower-cased name; the first of repeated headers wins"""
+        return {header['name'].lower(): header['value'] for header in reversed(headers)}
+    
     def _get_header(self, headers: List[Dict], name: str) -> Optional[str]:
         """Extract specific header value"""
-        for header in headers:
-            if header['name'].lower() == name.lower():
-                return header['value']
-        return None
+        return self._header_map(headers).get(name.lower())
+    
+    def _walk_parts(self, payload: Dict):
+        """The payload and its nested MIME parts, depth first"""
+        yield payload
+        for part in payload.get('parts', ()):
+            yield from self._walk_parts(part)
     
     def _extract_body(self, payload: Dict) -> str:
-        """Extract email body from payload"""
-        body = ""
-        
-        if 'parts' in payload:
-            # Multipart message
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    body = self._decode_body(part['body'].get('data', ''))
-                    break
-                elif part['mimeType'] == 'text/html' and not body:
-                    body = self._decode_body(part['body'].get('data', ''))
-        else:
-            # Simple message
-            body = self._decode_body(payload['body'].get('data', ''))
+        """
+        Extract email body from payload: the first text/plain part at any
+        nesting depth, else the first text/html part. Only that part is decoded.
+        """
+        html_part = None
+        for part in self._walk_parts(payload):
+            data = part.get('body', {}).get('data')
+            if not data or part.get('filename'):
+                # Containers and attachments
+                continue
+            mime_type = part.get('mimeType', 'text/plain')
+            if mime_type == 'text/plain':
+                return self._decode_body(data, charset=self._part_charset(part))
+            if mime_type == 'text/html' and html_part is None:
+                html_part = part
         
-        return body or payload.get('snippet', '')
+        if html_part is None:
+            return ""
+        return self._decode_body(html_part['body']['data'], html=True)
     
-    def _decode_body(self, data: str) -> str:
-        """Decode base64 email body"""
+    def _part_charset(self, part: Dict) -> str:
+        """Charset declared in a part's Content-Type header, defaulting to UTF-8"""
+        content_type = self._header_map(part.get('headers', [])).get('content-type', '')
+        match = CHARSET_RE.search(content_type)
+        return match.group(1) if match else 'utf-8'
+    
+    def _decode_body(self, data: str, html: bool = False, charset: str = 'utf-8') -> str:
+        """
+        Decode base64 email body, extracting the text of HTML parts. Bytes are
+        decoded once: HTML goes to the parser as bytes (it detects the charset),
+        plain text is decoded with the part's declared charset.
+        """
         if not data:
             return ""
         try:
-            decoded = base64.urlsafe_b64decode(data).decode('utf-8')
-            # Remove HTML tags if present
-            return re.sub('<[^<]+?>', '', decoded)
+            raw = b64url_decode(data)
+            if html:
+                return html_to_text(raw)
+            try:
+                return raw.decode(charset, 'replace')
+            except LookupError:
+                # Unknown charset name
+                return raw.decode('utf-8', 'replace')
         except Exception as e:
             print(f"Error decoding body: {e}")
             return ""
     
     def _parse_sender(self, sender: str) -> tuple:
         """Parse sender name and email from 'Name <email>' format"""
-        match = re.match(r'(.+?)\s*<(.+?)>', sender)
-        if match:
-            return match.group(1).strip('"'), match.group(2)
-        return sender, sender
+        return _parse_sender_cached(sender)
     
     def send_email(self, to: str, subject: str, body: str, thread_id: str = None) -> Dict:
         """
@@ -211,18 +353,20 @@ class GmailService:
             Sent reply details
         """
         try:
-            # Get original email details
+            # Only the thread and the From / Subject headers of the original are needed
             original = self.service.users().messages().get(
                 userId=self.user_id,
                 id=original_email_id,
-                format='full'
+                format='metadata',
+                metadataHeaders=['From', 'Subject'],
+                fields='threadId,payload/headers'
             ).execute()
             
-            headers = original['payload'].get('headers', [])
+            header_map = self._header_map(original['payload'].get('headers', []))
             
             # Extract reply information
-            original_sender = self._get_header(headers, 'From')
-            original_subject = self._get_header(headers, 'Subject')
+            original_sender = header_map.get('from')
+            original_subject = header_map.get('subject', '')
             thread_id = original.get('threadId')
             
             # Ensure "Re:" prefix
@@ -268,7 +412,7 @@ class GmailService:
             print(f"Error trashing email: {error}")
             raise Exception(f"Failed to move email to Trash: {str(error)}")
     
-    def search_emails(self, query: str, max_results: int = 10) -> List[Dict]:
+    def search_emails(self, query: str, max_results: int = 10, need_body: bool = False) -> List[Dict]:
         """
         Search emails with Gmail query syntax
         
@@ -279,11 +423,12 @@ class GmailService:
                 - "subject:invoice"
                 - "is:unread"
                 - "after:2024/01/01"
+            need_body: Fetch full messages instead of headers and snippet only
         
         Returns:
             List of matching emails
         """
-        return self.fetch_emails(max_results=max_results, query=query)
+        return self.fetch_emails(max_results=max_results, query=query, need_body=need_body)
     
     def mark_as_read(self, message_id: str) -> Dict:
         """Mark email as read"""
@@ -6,7 +6,109 @@ Helper functions for natural language processing and command interpretation
 
 from typing import Dict, List, Optional
 import re
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from functools import lru_cache
+
+
+WORD_TO_NUM = {
+    'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5,
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5
+}
+WORD_NUMBER_RE = re.compile(r'\b(' + '|'.join(WORD_TO_NUM) + r')\b', re.IGNORECASE)
+
+# Compiled once; these run on every chat message
+# Pattern: #2, number 2, email 2 (checked in this order)
+EMAIL_NUMBER_PATTERNS = [
+    re.compile(r'#(\d+)'),
+    re.compile(r'number\s+(\d+)'),
+    re.compile(r'email\s+(\d+)'),
+    re.compile(r'message\s+(\d+)')
+]
+EMAIL_ADDRESS_RE = re.compile(r'[\w\.-]+@[\w\.-]+')
+# Name after 'from', 'by' or 'sender'
+SENDER_NAME_PATTERNS = [
+    re.compile(r'from\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)'),
+    re.compile(r'by\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)'),
+    re.compile(r'sender\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)')
+]
+KEYWORD_RE = re.compile(r'\b[a-z]{3,}\b')
+# Keyword substrings per intent, in priority order: the first intent with any match wins
+INTENT_KEYWORDS = (
+    ('read', ('show', 'list', 'display', 'get', 'fetch', 'read')),
+    ('reply', ('reply', 'respond', 'answer', 'write back')),
+    ('delete', ('delete', 'remove', 'trash', 'get rid')),
+    ('search', ('find', 'search', 'look for', 'filter')),
+    ('digest', ('digest', 'summary', 'overview', 'summarize')),
+)
+# Phrases parse_time_reference understands, checked in this order
+TIME_PHRASES = ('today', 'yesterday', 'this week', 'last week', 'this month')
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 
+    'for', 'of', 'with', 'by', 'from', 'about', 'show', 'get', 
+    'find', 'delete', 'reply', 'email', 'emails', 'me', 'my'
+})
+
+
+@lru_cache(maxsize=1)
+def time_queries(today: date) -> Dict[str, str]:
+    """Gmail date filters for each of TIME_PHRASES, built once per day"""
+    return {
+        'today': f"after:{today.strftime('%Y/%m/%d')}",
+        'yesterday': f"after:{(today - timedelta(days=1)).strftime('%Y/%m/%d')} before:{today.strftime('%Y/%m/%d')}",
+        'this week': f"after:{(today - timedelta(days=7)).strftime('%Y/%m/%d')}",
+        'last week': f"after:{(today - timedelta(days=14)).strftime('%Y/%m/%d')} before:{(today - timedelta(days=7)).strftime('%Y/%m/%d')}",
+        'this month': f"after:{today.replace(day=1).strftime('%Y/%m/%d')}",
+    }
+
+
+# Chat commands repeat ("show my emails", "reply to the first one"), so the
+# extractors are memoized on their normalized input
+
+@lru_cache(maxsize=1024)
+def _email_number(text_lower: str) -> Optional[int]:
+    for pattern in EMAIL_NUMBER_PATTERNS:
+        match = pattern.search(text_lower)
+        if match:
+            return int(match.group(1))
+    
+    # Word numbers: one scan, and the word that appears first in the text wins
+    match = WORD_NUMBER_RE.search(text_lower)
+    if match:
+        return WORD_TO_NUM[match.group(1)]
+    
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _sender(text: str) -> Optional[str]:
+    email_match = EMAIL_ADDRESS_RE.search(text)
+    if email_match:
+        return email_match.group(0)
+    
+    for pattern in SENDER_NAME_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1)
+    
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _keywords(text_lower: str) -> tuple:
+    words = KEYWORD_RE.findall(text_lower)
+    
+    # Filter stop words and dedupe in one pass, keeping first occurrences
+    return tuple(dict.fromkeys(w for w in words if w not in STOP_WORDS))[:5]
+
+
+@lru_cache(maxsize=1024)
+def _intent(text_lower: str) -> str:
+    for intent, keywords in INTENT_KEYWORDS:
+        for keyword in keywords:
+            if keyword in text_lower:
+                return intent
+    
+    return 'unknown'
 
 
 class NLPService:
@@ -23,30 +125,7 @@ class NLPService:
         Returns:
             Email number (1-indexed) or None
         """
-        # Pattern: #2, number 2, email 2
-        patterns = [
-            r'#(\d+)',
-            r'number\s+(\d+)',
-            r'email\s+(\d+)',
-            r'message\s+(\d+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text.lower())
-            if match:
-                return int(match.group(1))
-        
-        # Word numbers
-        word_to_num = {
-            'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5,
-            'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5
-        }
-        
-        for word, num in word_to_num.items():
-            if word in text.lower():
-                return num
-        
-        return None
+        return _email_number(text.strip().lower())
     
     @staticmethod
     def extract_sender(text: str) -> Optional[str]:
@@ -59,25 +138,8 @@ class NLPService:
         Returns:
             Sender name/email or None
         """
-        # Email pattern
-        email_pattern = r'[\w\.-]+@[\w\.-]+'
-        email_match = re.search(email_pattern, text)
-        if email_match:
-            return email_match.group(0)
-        
-        # Name after 'from' or 'by'
-        name_patterns = [
-            r'from\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)',
-            r'by\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)',
-            r'sender\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)'
-        ]
-        
-        for pattern in name_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-        
-        return None
+        # Names are matched by capitalization, so only whitespace is normalized
+        return _sender(text.strip())
     
     @staticmethod
     def extract_keywords(text: str) -> List[str]:
@@ -88,22 +150,9 @@ class NLPService:
             text: Input text
         
         Returns:
-            List of keywords
+            Up to 5 unique keywords, in the order they appear
         """
-        # Remove common words
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 
-            'for', 'of', 'with', 'by', 'from', 'about', 'show', 'get', 
-            'find', 'delete', 'reply', 'email', 'emails', 'me', 'my'
-        }
-        
-        # Extract words
-        words = re.findall(r'\b[a-z]{3,}\b', text.lower())
-        
-        # Filter stop words
-        keywords = [w for w in words if w not in stop_words]
-        
-        return list(set(keywords))[:5]  # Return up to 5 unique keywords
+        return list(_keywords(text.strip().lower()))
     
     @staticmethod
     def parse_time_reference(text: str) -> Optional[str]:
@@ -117,21 +166,11 @@ class NLPService:
             Gmail query string for date filtering
         """
         text_lower = text.lower()
-        today = datetime.now()
-        
-        time_mappings = {
-            'today': f"after:{today.strftime('%Y/%m/%d')}",
-            'yesterday': f"after:{(today - timedelta(days=1)).strftime('%Y/%m/%d')} before:{today.strftime('%Y/%m/%d')}",
-            'this week': f"after:{(today - timedelta(days=7)).strftime('%Y/%m/%d')}",
-            'last week': f"after:{(today - timedelta(days=14)).strftime('%Y/%m/%d')} before:{(today - timedelta(days=7)).strftime('%Y/%m/%d')}",
-            'this month': f"after:{today.replace(day=1).strftime('%Y/%m/%d')}",
-        }
+        phrase = next((phrase for phrase in TIME_PHRASES if phrase in text_lower), None)
+        if phrase is None:
+            return None
         
-        for phrase, query in time_mappings.items():
-            if phrase in text_lower:
-                return query
-        
-        return None
+        return time_queries(date.today())[phrase]
     
     @staticmethod
     def build_gmail_query(parameters: Dict) -> str:
@@ -148,16 +187,11 @@ class NLPService:
         
         # Sender
         if parameters.get('sender'):
-            sender = parameters['sender']
-            if '@' in sender:
-                query_parts.append(f"from:{sender}")
-            else:
-                query_parts.append(f"from:{sender}")
+            query_parts.append(f"from:{parameters['sender']}")
         
-        # Subject keywords
+        # Subject keywords (blank ones would produce a bare "subject:")
         if parameters.get('subject_keywords'):
-            for keyword in parameters['subject_keywords']:
-                query_parts.append(f"subject:{keyword}")
+            query_parts.extend(f"subject:{keyword}" for keyword in parameters['subject_keywords'] if keyword)
         
         # General query
         if parameters.get('query'):
@@ -184,29 +218,7 @@ class NLPService:
         Returns:
             Intent: read, reply, delete, search, digest, unknown
         """
-        text_lower = text.lower()
-        
-        # Read intents
-        if any(word in text_lower for word in ['show', 'list', 'display', 'get', 'fetch', 'read']):
-            return 'read'
-        
-        # Reply intents
-        if any(word in text_lower for word in ['reply', 'respond', 'answer', 'write back']):
-            return 'reply'
-        
-        # Delete intents
-        if any(word in text_lower for word in ['delete', 'remove', 'trash', 'get rid']):
-            return 'delete'
-        
-        # Search intents
-        if any(word in text_lower for word in ['find', 'search', 'look for', 'filter']):
-            return 'search'
-        
-        # Digest intents
-        if any(word in text_lower for word in ['digest', 'summary', 'overview', 'summarize']):
-            return 'digest'
-        
-        return 'unknown'
+        return _intent(text.strip().lower())
     
     @staticmethod
     def format_email_list(emails: List[Dict]) -> str:
@@ -222,11 +234,13 @@ class NLPService:
         if not emails:
             return "No emails found."
         
-        formatted = f"Found {len(emails)} email(s):\n\n"
+        parts = [f"Found {len(emails)} email(s):\n\n"]
         
         for idx, email in enumerate(emails, 1):
-            formatted += f"{idx}. From: {email.get('sender_name', 'Unknown')}\n"
-            formatted += f"   Subject: {email.get('subject', 'No Subject')}\n"
-            formatted += f"   Date: {email.get('date', 'Unknown')}\n\n"
+            parts.append(
+                f"{idx}. From: {email.get('sender_name', 'Unknown')}\n"
+                f"   Subject: {email.get('subject', 'No Subject')}\n"
+                f"   Date: {email.get('date', 'Unknown')}\n\n"
+            )
         
-        return formatted
+        return "".join(parts)
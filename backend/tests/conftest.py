@@ -0,0 +1,5 @@
+import os
+
+# Modules read these at import time; tests that depend on the values patch them
+os.environ.setdefault("GEMINI_API_KEY", "test-gemini-key")
+os.environ.setdefault("JWT_SECRET_KEY", "test-jwt-secret-key-of-at-least-32-bytes")
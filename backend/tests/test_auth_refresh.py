@@ -0,0 +1,111 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+from routers import auth
+from utils import jwt as jwt_utils
+
+
+def fake_google(monkeypatch, fail_first=False, expires_in=None):
+    """Slow stand-in for the token endpoint that records how many calls overlap"""
+    state = {"calls": 0, "active": 0, "max_active": 0}
+
+    async def request_access_token(refresh_token):
+        state["calls"] += 1
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        try:
+            await asyncio.sleep(0.05)
+            if fail_first and state["calls"] == 1:
+                raise RuntimeError("invalid_grant")
+            expires_at = time.time() + expires_in if expires_in else None
+            return {"access_token": f"access-{state['calls']}", "expires_at": expires_at}
+        finally:
+            state["active"] -= 1
+
+    monkeypatch.setattr(auth, "_request_access_token", request_access_token)
+    monkeypatch.setattr(auth, "schedule_token_refresh", lambda *args: None)
+    auth._refresh_cache.clear()
+    return state
+
+
+def test_concurrent_refreshes_share_one_google_call(monkeypatch):
+    google = fake_google(monkeypatch)
+
+    async def refresh_three_times():
+        return await asyncio.gather(*(auth.refresh_token("rt") for _ in range(3)))
+
+    responses = asyncio.run(refresh_three_times())
+    assert [r["access_token"] for r in responses] == ["access-1"] * 3
+    assert google["calls"] == 1
+    assert auth._refresh_locks == {}
+
+
+def test_refresh_lock_survives_while_a_waiter_is_waking(monkeypatch):
+    google = fake_google(monkeypatch, fail_first=True)
+
+    async def late_refresh():
+        # Arrives while the woken waiter is mid-refresh
+        await asyncio.sleep(0.075)
+        return await auth.refresh_token("rt")
+
+    async def race():
+        return await asyncio.gather(
+            auth.refresh_token("rt"), auth.refresh_token("rt"), late_refresh(),
+            return_exceptions=True
+        )
+
+    first, second, late = asyncio.run(race())
+    assert isinstance(first, HTTPException)
+    assert second["access_token"] == late["access_token"] == "access-2"
+    assert google["max_active"] == 1
+    assert auth._refresh_locks == {}
+
+
+def test_background_refresh_runs_only_while_the_client_refreshes(monkeypatch):
+    schedule_token_refresh = auth.schedule_token_refresh
+    google = fake_google(monkeypatch, expires_in=0.06)
+    monkeypatch.setattr(auth, "schedule_token_refresh", schedule_token_refresh)
+    monkeypatch.setattr(auth, "REFRESH_AHEAD_MIN_WAIT", 0)
+
+    async def one_refresh_then_idle():
+        await auth.refresh_token("rt")
+        # Several token lifetimes without another /auth/refresh call
+        await asyncio.sleep(0.3)
+
+    asyncio.run(one_refresh_then_idle())
+    # The client's own refresh, then one ahead of its expiry, then nothing
+    assert google["calls"] == 2
+    assert auth._scheduled_refreshes == {}
+    assert auth._refresh_demand == set()
+
+
+def test_logout_with_app_jwt_cancels_background_refresh(monkeypatch):
+    schedule_token_refresh = auth.schedule_token_refresh
+    fake_google(monkeypatch, expires_in=3600)
+    monkeypatch.setattr(auth, "schedule_token_refresh", schedule_token_refresh)
+    monkeypatch.setattr(auth, "JWT_KEY", b"test-secret-key")
+    monkeypatch.setattr(jwt_utils, "JWT_KEY", b"test-secret-key")
+    revoked = []
+
+    async def revoke(url, params, **kwargs):
+        revoked.append(params["token"])
+        return SimpleNamespace(status_code=200)
+
+    monkeypatch.setattr(auth, "http_client", SimpleNamespace(post=revoke))
+    app_jwt = auth.create_jwt_token({"id": "user-1"}, {"access_token": "at", "refresh_token": "rt"})
+
+    async def session():
+        await auth.refresh_token("rt")
+        task = auth._scheduled_refreshes[auth._token_key("rt")]
+        await auth.logout(app_jwt)
+        await asyncio.sleep(0)
+        return task
+
+    task = asyncio.run(session())
+    assert task.cancelled()
+    assert revoked == ["rt"]
+    assert auth._scheduled_refreshes == {}
+    assert auth._token_key("rt") not in auth._refresh_cache
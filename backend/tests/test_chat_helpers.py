@@ -1,5 +1,7 @@
+import asyncio
 from datetime import datetime
 
+from routers import chat
 from routers.chat import (
     format_email_for_display,
     find_email_by_criteria,
@@ -13,12 +15,20 @@ class DummyGmailService:
     def __init__(self, emails):
         # emails is a list of email dicts as returned by GmailService.fetch_emails
         self._emails = emails
+        self.queries = []
 
-    def fetch_emails(self, max_results=5, query=""):
+    def fetch_emails(self, max_results=5, query="", need_body=False):
         return self._emails[:max_results]
 
-    def search_emails(self, query, max_results=10):
+    def fetch_nth_email_id(self, n, query=""):
+        return self._emails[n - 1]["id"] if len(self._emails) >= n else None
+
+    def get_email_by_id(self, message_id, need_body=True):
+        return next((email for email in self._emails if email["id"] == message_id), None)
+
+    def search_emails(self, query, max_results=10, need_body=False):
         # Very small fake that searches by "from:" or "subject:" in a naive way
+        self.queries.append(query)
         results = []
         if query.startswith("from:"):
             sender = query[len("from:") :]
@@ -110,6 +120,18 @@ def test_find_email_by_subject_keyword_uses_search():
     assert email["id"] == "1"
 
 
+def test_find_email_does_not_repeat_a_missed_sender_search():
+    gmail = DummyGmailService([make_raw_email(id="1", sender="Alice <alice@example.com>")])
+
+    email = find_email_by_criteria(
+        gmail_service=gmail,
+        sender="nobody@example.com",
+        user_message="open the email from nobody@example.com",
+    )
+    assert email is None
+    assert gmail.queries == ["from:nobody@example.com"]
+
+
 def test_create_response_has_basic_shape():
     resp = create_response(
         "hello", emails=[{"id": "1"}], actions=[{"type": "test"}]
@@ -123,3 +145,36 @@ def test_create_response_has_basic_shape():
     assert "timestamp" in resp
 
 
+
+
+def test_stream_sends_first_reply_before_the_last_is_generated(monkeypatch):
+    pending = [
+        (idx, {"id": str(idx), "subject": f"Email {idx}"}, {"body": f"body {idx}", "sender_name": "Alice"})
+        for idx in range(1, 7)
+    ]
+    finished = []
+
+    async def collect_reply_targets(gmail_service, payload):
+        return pending
+
+    async def generate_replies_async(requests, tone="professional"):
+        # Later chunks take longer, like a queue behind the Gemini rate limit
+        await asyncio.sleep(0.01 * int(requests[0]["body"].split()[1]))
+        finished.append(len(requests))
+        return [f"reply to {request['body']}" for request in requests]
+
+    monkeypatch.setattr(chat, "collect_reply_targets", collect_reply_targets)
+    monkeypatch.setattr(chat, "generate_replies_async", generate_replies_async)
+
+    async def collect_events():
+        events = []
+        async for event in chat.stream_generated_replies(None, {}):
+            events.append((event.split("\n", 1)[0], list(finished)))
+        return events
+
+    events = asyncio.run(collect_events())
+    replies = [done_so_far for name, done_so_far in events if name == "event: reply"]
+    assert len(replies) == 6
+    assert sum(replies[0]) < len(pending)
+    assert all(size <= chat.STREAM_REPLY_BATCH_SIZE for size in finished)
+    assert events[-1][0] == "event: done"
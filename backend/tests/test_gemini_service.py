@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted
+
+from services import gemini_service
+from services.gemini_service import GeminiService
+
+
+class ScriptedModel:
+    """Returns (or raises) the scripted outcomes in order"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.prompts = []
+
+    @property
+    def calls(self):
+        return len(self.prompts)
+
+    async def generate_content_async(self, prompt):
+        self.prompts.append(prompt)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(text=outcome)
+
+
+def make_service(monkeypatch, model):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_service, "BACKOFF_MIN_SECONDS", 0)
+    monkeypatch.setattr(gemini_service, "BACKOFF_MAX_SECONDS", 0)
+    monkeypatch.setattr(gemini_service, "JSON_RETRY_SECONDS", 0)
+    service = GeminiService()
+    service.model = model
+    service._task_models = dict.fromkeys(service._task_models, model)
+    return service
+
+
+def test_rate_limited_calls_are_retried(monkeypatch):
+    model = ScriptedModel(ResourceExhausted("quota"), ResourceExhausted("quota"), "Short summary")
+    service = make_service(monkeypatch, model)
+
+    assert asyncio.run(service.summarize_email("Lunch at noon?")) == "Short summary"
+    assert model.calls == 3
+
+
+def test_invalid_arguments_are_not_retried(monkeypatch):
+    model = ScriptedModel(InvalidArgument("bad prompt"))
+    service = make_service(monkeypatch, model)
+
+    with pytest.raises(InvalidArgument):
+        asyncio.run(service._generate("prompt"))
+    assert model.calls == 1
+
+
+def test_unparseable_json_is_requested_again(monkeypatch):
+    model = ScriptedModel("not json", '{"action": "read", "parameters": {}}')
+    service = make_service(monkeypatch, model)
+
+    parsed = asyncio.run(service.parse_command("show my emails"))
+    assert parsed["action"] == "read"
+    assert model.calls == 2
+
+
+def test_task_prompts_carry_only_the_dynamic_payload(monkeypatch):
+    model = ScriptedModel('{"action": "read", "parameters": {}}')
+    service = make_service(monkeypatch, model)
+
+    asyncio.run(service.parse_command("show my emails"))
+    assert "show my emails" in model.prompts[0]
+    assert "Rules:" not in model.prompts[0]
+
+
+def test_concurrent_identical_requests_share_one_call(monkeypatch):
+    model = ScriptedModel("Shared summary")
+    service = make_service(monkeypatch, model)
+
+    async def summarize_twice():
+        return await asyncio.gather(
+            service.summarize_email("Lunch at noon?"),
+            service.summarize_email("Lunch  at noon?\n")
+        )
+
+    assert asyncio.run(summarize_twice()) == ["Shared summary", "Shared summary"]
+    assert model.calls == 1
+
+
+def test_batch_summaries_are_cached_per_email(monkeypatch):
+    model = ScriptedModel('["First summary", "Second summary"]')
+    service = make_service(monkeypatch, model)
+
+    async def batch_then_single():
+        await service.summarize_emails_batch(["First email", "Second email"])
+        return await service.summarize_email("Second  email")
+
+    assert asyncio.run(batch_then_single()) == "Second summary"
+    assert service.cached_summary("First email") == "First summary"
+    assert model.calls == 1
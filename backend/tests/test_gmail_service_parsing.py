@@ -1,16 +1,27 @@
 from services.gmail_service import GmailService
 
 
+class DummyRequest:
+    """Stands in for a googleapiclient HttpRequest; execute() returns the canned result."""
+
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
 class DummyMessagesResource:
     """Minimal fake for service.users().messages() chain used by GmailService."""
 
     def __init__(self, messages_map):
         # messages_map: id -> message dict
         self._messages_map = messages_map
+        self._ids = tuple(messages_map)
 
     def list(self, userId, maxResults, q):
         # Return all message ids up to maxResults; query is ignored for unit test
-        ids = [{"id": msg_id} for msg_id in list(self._messages_map.keys())[:maxResults]]
+        ids = [{"id": msg_id} for msg_id in self._ids[:maxResults]]
         return DummyRequest({"messages": ids})
 
     def get(self, userId, id, format):
@@ -19,6 +30,7 @@ class DummyMessagesResource:
     def delete(self, userId, id):
         # For delete_email; we just record that delete was called
         self._messages_map.pop(id, None)
+        self._ids = tuple(self._messages_map)
         return DummyRequest({})
 
     def modify(self, userId, id, body):
@@ -121,6 +133,23 @@ def test_extract_body_falls_back_to_snippet_when_no_body_data(monkeypatch):
     assert email["body"] == snippet
 
 
+def test_html_body_is_reduced_to_visible_text():
+    import base64
+
+    html = "<html><head><style>p {color: red}</style></head><body><p>Meeting at <b>3pm</b></p><script>track()</script></body></html>"
+    headers = [{"name": "Subject", "value": "HTML"}, {"name": "From", "value": "html@example.com"}]
+    messages_map = {
+        "msg-html": make_payload(
+            headers=headers,
+            body_data=base64.urlsafe_b64encode(html.encode()).decode().rstrip("="),
+            mime_type="text/html",
+        )
+    }
+
+    email = DummyGmailService(messages_map).get_email_by_id("msg-html")
+    assert email["body"] == "Meeting at 3pm"
+
+
 def test_parse_sender_handles_plain_email():
     gmail = DummyGmailService({})
     name, email_addr = gmail._parse_sender("plain@example.com")
@@ -128,6 +157,18 @@ def test_parse_sender_handles_plain_email():
     assert email_addr == "plain@example.com"
 
 
+def test_parse_sender_handles_quoted_and_bare_addresses():
+    gmail = DummyGmailService({})
+    assert gmail._parse_sender('"Doe, Jane" <jane@example.com>') == ("Doe, Jane", "jane@example.com")
+    assert gmail._parse_sender("<bare@example.com>") == ("bare@example.com", "bare@example.com")
+
+
+def test_parse_sender_keeps_display_names_without_an_address():
+    gmail = DummyGmailService({})
+    assert gmail._parse_sender("Unknown Sender") == ("Unknown Sender", "Unknown Sender")
+    assert gmail._parse_sender("John Smith") == ("John Smith", "John Smith")
+
+
 def test_mark_as_read_and_unread_use_modify():
     headers = [
         {"name": "Subject", "value": "Mark Read"},
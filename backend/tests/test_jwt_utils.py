@@ -1,9 +1,14 @@
 import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
-from jose import jwt
+import jwt
+import pytest
 from fastapi import HTTPException
 
+from utils import jwt as jwt_utils
 from utils.jwt import get_current_user
 
 
@@ -12,7 +17,9 @@ def make_token(secret: str, payload_extra: dict = None, expires_in_seconds: int
     payload = {
         "sub": "user-123",
         "email": "user@example.com",
+        "iat": int(now.timestamp()),
         "exp": int((now + timedelta(seconds=expires_in_seconds)).timestamp()),
+        "jti": secrets.token_urlsafe(16),
     }
     if payload_extra:
         payload.update(payload_extra)
@@ -21,7 +28,7 @@ def make_token(secret: str, payload_extra: dict = None, expires_in_seconds: int
 
 def test_get_current_user_decodes_valid_token(monkeypatch):
     secret = "test-secret-key"
-    monkeypatch.setenv("JWT_SECRET_KEY", secret)
+    monkeypatch.setattr(jwt_utils, "JWT_KEY", secret.encode())
 
     token = make_token(secret)
     authorization_header = f"Bearer {token}"
@@ -44,7 +51,7 @@ def test_get_current_user_rejects_missing_header():
 
 def test_get_current_user_rejects_expired_token(monkeypatch):
     secret = "test-secret-key"
-    monkeypatch.setenv("JWT_SECRET_KEY", secret)
+    monkeypatch.setattr(jwt_utils, "JWT_KEY", secret.encode())
 
     # Token expired 1 second ago
     token = make_token(secret, expires_in_seconds=-1)
@@ -59,3 +66,30 @@ def test_get_current_user_rejects_expired_token(monkeypatch):
         assert False, "Expected HTTPException for expired token"
 
 
+def test_decode_token_rechecks_expiry_for_cached_tokens(monkeypatch):
+    secret = "test-secret-key"
+    monkeypatch.setattr(jwt_utils, "JWT_KEY", secret.encode())
+
+    token = make_token(secret, expires_in_seconds=60)
+    first = jwt_utils.decode_token(token)
+    first["email"] = "changed@example.com"
+    assert jwt_utils.decode_token(token)["email"] == "user@example.com"
+
+    later = time.time() + 120
+    monkeypatch.setattr(jwt_utils.time, "time", lambda: later)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        jwt_utils.decode_token(token)
+
+
+def test_decode_token_is_safe_from_threadpool_workers(monkeypatch):
+    secret = "test-secret-key"
+    monkeypatch.setattr(jwt_utils, "JWT_KEY", secret.encode())
+    # A small cache keeps evictions racing with reads
+    monkeypatch.setattr(jwt_utils, "_verified_cache", jwt_utils.TTLCache(maxsize=8, ttl=300))
+
+    tokens = [make_token(secret, {"sub": f"user-{i}"}) for i in range(64)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        subs = list(pool.map(lambda t: get_current_user(authorization=f"Bearer {t}")["sub"], tokens * 20))
+
+    assert subs == [f"user-{i}" for i in range(64)] * 20
+    assert len(jwt_utils._verified_cache) <= 8
@@ -44,6 +44,11 @@ def test_extract_keywords_filters_stop_words_and_dedupes():
     assert len(keywords) <= 5
 
 
+def test_extract_keywords_keeps_first_five_in_text_order():
+    text = "invoice budget invoice meeting report deadline travel"
+    assert NLPService.extract_keywords(text) == ["invoice", "budget", "meeting", "report", "deadline"]
+
+
 def test_detect_intent_read_vs_reply_vs_delete_vs_search_vs_digest():
     assert NLPService.detect_intent("Show me my last 5 emails") == "read"
     assert NLPService.detect_intent("Please reply to this message") == "reply"
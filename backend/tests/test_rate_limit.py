@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from utils import rate_limit
+from utils.rate_limit import RateLimiter, TokenBucket, client_ip
+
+
+def make_request(host="1.2.3.4", forwarded=None):
+    headers = []
+    if forwarded:
+        headers.append((b"x-forwarded-for", forwarded.encode()))
+    return Request({"type": "http", "headers": headers, "client": (host, 1234)})
+
+
+def test_token_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(rate=1, capacity=2)
+
+    assert bucket.consume() == 0
+    assert bucket.consume() == 0
+
+    wait = bucket.consume()
+    assert 0 < wait <= 1
+
+
+def test_client_ip_prefers_last_forwarded_hop_from_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", frozenset({"1.2.3.4"}))
+    request = make_request(forwarded="10.0.0.1, 5.6.7.8")
+    assert client_ip(request) == "5.6.7.8"
+    assert client_ip(make_request()) == "1.2.3.4"
+
+
+def test_client_ip_ignores_forwarded_header_from_untrusted_peer(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXIES", frozenset())
+    assert client_ip(make_request(forwarded="5.6.7.8")) == "1.2.3.4"
+
+
+def test_rate_limiter_rejects_after_capacity_per_client():
+    limiter = RateLimiter(rate=0.1, capacity=1)
+
+    asyncio.run(limiter(make_request(host="1.1.1.1")))
+    # A different client has its own bucket
+    asyncio.run(limiter(make_request(host="2.2.2.2")))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(limiter(make_request(host="1.1.1.1")))
+
+    assert exc.value.status_code == 429
+    assert "Retry-After" in exc.value.headers
@@ -0,0 +1,35 @@
+from utils.response_cache import ResponseCache, cache_key
+
+
+def test_cache_key_is_stable_and_separates_parts():
+    assert cache_key("a", "b") == cache_key("a", "b")
+    assert cache_key("ab", "") != cache_key("a", "b")
+
+
+def test_response_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.jsonl")
+
+    cache = ResponseCache(maxsize=10, path=path)
+    cache.set("k1", "first")
+    cache.set("k2", "second")
+    cache.discard("k1")
+
+    reloaded = ResponseCache(maxsize=10, path=path)
+    assert reloaded.get("k1") is None
+    assert reloaded.get("k2") == "second"
+
+
+def test_response_cache_skips_torn_lines_and_compacts(tmp_path):
+    path = tmp_path / "cache.jsonl"
+
+    cache = ResponseCache(maxsize=2, path=str(path))
+    for i in range(5):
+        cache.set(f"k{i}", f"v{i}")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"k": "torn", "v"')
+
+    reloaded = ResponseCache(maxsize=2, path=str(path))
+    assert reloaded.get("k4") == "v4"
+    assert reloaded.get("k0") is None
+    # Six lines on disk exceed twice the cache size, so the file was rewritten
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 2
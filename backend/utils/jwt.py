@@ -1,9 +1,77 @@
 # JWT utilities
 from fastapi import HTTPException, Header
-from jose import jwt, JWTError
+from google.oauth2.credentials import Credentials
+from cachetools import TTLCache
+from typing import Optional
+import hashlib
+import jwt
+import logging
 import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# HS256 wants a key at least as long as its 32-byte digest
+JWT_MIN_KEY_BYTES = 32
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+if not JWT_SECRET_KEY:
+    raise ValueError("JWT_SECRET_KEY not found in environment")
+# HMAC wants bytes; encode the secret once instead of on every sign/verify
+JWT_KEY = JWT_SECRET_KEY.encode()
+if len(JWT_KEY) < JWT_MIN_KEY_BYTES:
+    logger.warning(
+        "JWT_SECRET_KEY is %d bytes; use at least %d random bytes for HS256",
+        len(JWT_KEY), JWT_MIN_KEY_BYTES
+    )
+JWT_ALGORITHM = "HS256"
+# Every token we issue carries these; anything without them is rejected up front
+JWT_REQUIRED_CLAIMS = ["exp", "iat", "jti"]
+
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+
+# Payloads of tokens that already passed verification, keyed by token hash.
+# A hit skips the signature and claim checks; expiry is still checked every time.
+# get_current_user runs in the threadpool and TTLCache isn't thread-safe, so every
+# access holds the lock; signature verification happens outside it.
+_verified_cache = TTLCache(maxsize=10_000, ttl=300)
+_verified_cache_lock = threading.Lock()
+
+BEARER_PREFIX = "Bearer "
+_BEARER_PREFIX_LEN = len(BEARER_PREFIX)
+
+
+def extract_bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """Return the token from a 'Bearer <token>' header, or None if absent/malformed"""
+    if not authorization or not authorization.startswith(BEARER_PREFIX):
+        return None
+    return authorization[_BEARER_PREFIX_LEN:] or None
+
+
+def decode_token(token: str) -> dict:
+    """Verify an app-issued JWT; only HS256 is accepted, never 'none' or RSA algs"""
+    key = hashlib.sha256(token.encode()).hexdigest()
+    with _verified_cache_lock:
+        payload = _verified_cache.get(key)
+        if payload is not None and payload["exp"] <= time.time():
+            _verified_cache.pop(key, None)
+            raise jwt.ExpiredSignatureError("Signature has expired")
+    if payload is not None:
+        return dict(payload)
+
+    payload = jwt.decode(
+        token,
+        JWT_KEY,
+        algorithms=[JWT_ALGORITHM],
+        options={"require": JWT_REQUIRED_CLAIMS},
+    )
+    with _verified_cache_lock:
+        _verified_cache[key] = payload
+    # Callers get their own copy so the cached claims can't be modified
+    return dict(payload)
+
 
 def get_current_user(authorization: str = Header(None)):
     """
@@ -14,26 +82,25 @@ def get_current_user(authorization: str = Header(None)):
     async def protected_route(user: dict = Depends(get_current_user)):
         return {"user": user}
     """
-    if not authorization or not authorization.startswith("Bearer "):
+    token = extract_bearer_token(authorization)
+    if not token:
         raise HTTPException(
             status_code=401,
             detail="Missing or invalid authorization header",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    token = authorization.split(" ")[1]
-    
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
-        
-        # Check expiration
-        import time
-        if payload.get("exp") and payload["exp"] < time.time():
-            raise HTTPException(status_code=401, detail="Token expired")
-        
-        return payload
+        # PyJWT verifies exp itself; expired tokens surface as ExpiredSignatureError
+        return decode_token(token)
         
-    except JWTError as e:
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=401,
+            detail="Token expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except jwt.InvalidTokenError as e:
         raise HTTPException(
             status_code=401,
             detail=f"Invalid token: {str(e)}",
@@ -47,15 +114,12 @@ def get_gmail_credentials(user: dict):
     
     Returns Google Credentials object for API calls
     """
-    from google.oauth2.credentials import Credentials
-    from datetime import datetime
-    
     creds = Credentials(
         token=user.get("access_token"),
         refresh_token=user.get("refresh_token"),
         token_uri="https://oauth2.googleapis.com/token",
-        client_id=os.getenv("GOOGLE_CLIENT_ID"),
-        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+        client_id=GOOGLE_CLIENT_ID,
+        client_secret=GOOGLE_CLIENT_SECRET,
     )
     
     return creds
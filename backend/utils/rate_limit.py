@@ -0,0 +1,79 @@
+# Rate limiting utilities
+from fastapi import HTTPException, Request
+from cachetools import TTLCache
+import os
+import time
+
+# Peers whose X-Forwarded-For is believed: comma-separated addresses, or "*" when
+# the app only runs behind a platform proxy whose addresses aren't fixed (Render).
+# Unset means the header is ignored, since any client could send its own.
+TRUSTED_PROXIES = frozenset(
+    proxy.strip() for proxy in os.getenv("TRUSTED_PROXIES", "").split(",") if proxy.strip()
+)
+
+
+class TokenBucket:
+    """Token bucket refilled lazily from the time elapsed since the last call"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def consume(self) -> float:
+        """
+        Take one token
+
+        Returns:
+            0 when a token was taken, otherwise seconds until one is available
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def client_ip(request: Request) -> str:
+    """Client address; behind a trusted proxy, the hop it appended to X-Forwarded-For"""
+    peer = request.client.host if request.client else "unknown"
+    if "*" in TRUSTED_PROXIES or peer in TRUSTED_PROXIES:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.rsplit(",", 1)[-1].strip()
+    return peer
+
+
+class RateLimiter:
+    """
+    Dependency that throttles requests per client IP
+
+    Usage in routes:
+    @router.post("/refresh", dependencies=[Depends(RateLimiter(rate=1, capacity=3))])
+    """
+
+    def __init__(self, rate: float, capacity: int, max_clients: int = 10_000):
+        self.rate = rate
+        self.capacity = capacity
+        # An idle bucket is full again after capacity / rate seconds, so it can be dropped
+        self._buckets = TTLCache(maxsize=max_clients, ttl=capacity / rate)
+
+    async def __call__(self, request: Request):
+        key = client_ip(request)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.capacity)
+        # Re-insert on every hit so the TTL tracks the last request
+        self._buckets[key] = bucket
+
+        retry_after = bucket.consume()
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(int(retry_after) + 1)},
+            )
@@ -0,0 +1,93 @@
+# Response cache utilities
+from cachetools import LRUCache
+from typing import Optional
+import hashlib
+import json
+import os
+import threading
+
+
+def cache_key(*parts: str) -> str:
+    """Stable hex digest of the given strings"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of model responses, optionally persisted to an append-only
+    JSONL file so they survive restarts
+
+    Each write appends one {"k": key, "v": value} line; a null value records a
+    deletion. The file is rewritten from memory when it grows past twice the
+    cache size.
+    """
+
+    def __init__(self, maxsize: int, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self._entries = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._append(key, value)
+
+    def discard(self, key: str):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._append(key, None)
+
+    def _append(self, key: str, value: Optional[str]):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"k": key, "v": value}) + "\n")
+        except OSError as e:
+            print(f"Response cache write error: {e}")
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Response cache read error: {e}")
+            return
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+                key, value = record["k"], record["v"]
+            except (ValueError, KeyError, TypeError):
+                # Torn final line from an interrupted write
+                continue
+            if value is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = value
+
+        if len(lines) > 2 * self.maxsize:
+            self._compact()
+
+    def _compact(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for key, value in self._entries.items():
+                    f.write(json.dumps({"k": key, "v": value}) + "\n")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Response cache compaction error: {e}")
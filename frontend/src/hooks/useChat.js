@@ -2,6 +2,16 @@ import { useState, useCallback } from 'react';
 
 const generateId = () => `${Date.now()}-${Math.random().toString(36).substr(2, 9)}`;
 
+const toAssistantMessage = (response) => ({
+  id: response.id || generateId(),
+  type: 'assistant',
+  content: response.content || response.message || 'I received your message.',
+  emails: response.emails || [],
+  actions: response.actions || [],
+  groupedEmails: response.groupedEmails || [],
+  timestamp: response.timestamp ? new Date(response.timestamp) : new Date(),
+});
+
 export const useChat = (user) => {
   const [messages, setMessages] = useState([]);
   const [isTyping, setIsTyping] = useState(false);
@@ -38,17 +48,44 @@ How can I help you manage your inbox today?`,
   }, []);
 
   const appendAssistantMessage = useCallback((response) => {
-    const assistantMessage = {
-      id: response.id || generateId(),
-      type: 'assistant',
-      content: response.content || response.message || 'I received your message.',
-      emails: response.emails || [],
-      actions: response.actions || [],
-      groupedEmails: response.groupedEmails || [],
-      timestamp: response.timestamp ? new Date(response.timestamp) : new Date(),
-    };
+    setMessages((prev) => [...prev, toAssistantMessage(response)]);
+  }, []);
 
-    setMessages((prev) => [...prev, assistantMessage]);
+  // Generated replies stream in one by one; the final 'done' event replaces
+  // the partial message with the complete, ordered response.
+  const streamGeneratedReplies = useCallback(async (chatService, payload) => {
+    const messageId = generateId();
+
+    await chatService.streamAction(payload, (event, data) => {
+      if (event === 'start') {
+        setMessages((prev) => [
+          ...prev,
+          toAssistantMessage({ ...data, id: messageId }),
+        ]);
+        setIsTyping(false);
+      } else if (event === 'reply') {
+        setMessages((prev) => prev.map((message) => (
+          message.id === messageId
+            ? {
+              ...message,
+              content: message.content + data.content,
+              emails: [...message.emails, data.email],
+              actions: [...message.actions, data.action],
+            }
+            : message
+        )));
+      } else if (event === 'done') {
+        const finalMessage = toAssistantMessage({ ...data, id: messageId });
+        setMessages((prev) => (
+          prev.some((message) => message.id === messageId)
+            ? prev.map((message) => (message.id === messageId ? finalMessage : message))
+            : [...prev, finalMessage]
+        ));
+      } else if (event === 'error') {
+        setMessages((prev) => prev.filter((message) => message.id !== messageId));
+        throw new Error(data.detail);
+      }
+    });
   }, []);
 
   const sendMessage = useCallback(async (content) => {
@@ -96,8 +133,12 @@ How can I help you manage your inbox today?`,
         emailId: action.emailId,
         payload: action.payload,
       };
-      const response = await chatService.handleAction(payload);
-      appendAssistantMessage(response);
+      if (action.type === 'generate_replies') {
+        await streamGeneratedReplies(chatService, payload);
+      } else {
+        const response = await chatService.handleAction(payload);
+        appendAssistantMessage(response);
+      }
     } catch (error) {
       console.error('Error handling action:', error);
       
@@ -112,7 +153,7 @@ How can I help you manage your inbox today?`,
     } finally {
       setIsTyping(false);
     }
-  }, [appendAssistantMessage]);
+  }, [appendAssistantMessage, streamGeneratedReplies]);
 
   return {
     messages,
@@ -39,5 +39,42 @@ export const chatService = {
 
     return response.json();
   },
+
+  // Streams a generate_replies action as Server-Sent Events, calling
+  // onEvent(event, data) for each 'start' / 'reply' / 'done' / 'error' event.
+  streamAction: async (action, onEvent) => {
+    const response = await fetch(`${api.baseURL}/chat/action/stream`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+      body: JSON.stringify(action),
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.detail || 'Failed to handle action');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const rawEvent of events) {
+        let event = 'message';
+        const data = [];
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data.push(line.slice(5).trimStart());
+        }
+        if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+      }
+    }
+  },
 };
 